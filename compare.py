@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+
+import argparse
+import glob
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "mapping", "networks"))
+import results
+
+# metrics compared by the ratio of the medians, the durations of the single
+# phases are recorded for profiling but too short to be compared
+PERFORMANCE_METRICS = ["setup_time", "total_time", "max_memory"]
+# the interquartile ranges are only compared with enough samples on both sides
+MIN_SAMPLES = 3
+# metrics compared by the synapse loss relative to the number of synapses
+LOSS_METRICS = ["synapse_loss", "synapse_loss_after_l1"]
+
+
+def load_results(directory):
+    """Loads all result records of a directory keyed by (model, task).
+    If a grid point was run several times the latest record is used."""
+    records = {}
+    for filename in glob.glob(os.path.join(directory, "*_results.json")):
+        record = results.load(filename)
+        key = (record["model"], record["task"])
+        if key not in records or \
+                records[key]["timestamp"] < record["timestamp"]:
+            records[key] = record
+    return records
+
+
+def spread(entry):
+    """returns the interquartile range of a metric as tuple, a single
+    measurement has no spread"""
+    if "samples" not in entry:
+        return entry["value"], entry["value"]
+    return tuple(np.percentile(entry["samples"], [25, 75]))
+
+
+def samples(entry):
+    return len(entry.get("samples", [entry["value"]]))
+
+
+def compare_performance(base, current, threshold, min_delta=0):
+    """A performance metric regressed if the median changed by more than
+    the relative threshold and by at least min_delta in its units and, for
+    at least MIN_SAMPLES repeated measurements, the interquartile ranges do
+    not overlap. Returns the ratio of the medians and whether the change is
+    significant."""
+    if base["value"] == 0:
+        return None, False
+    ratio = current["value"] / float(base["value"])
+    significant = abs(ratio - 1) > threshold and \
+        abs(current["value"] - base["value"]) >= min_delta
+    if min(samples(base), samples(current)) >= MIN_SAMPLES:
+        base_low, base_high = spread(base)
+        current_low, current_high = spread(current)
+        overlap = current_low <= base_high and base_low <= current_high
+        significant = significant and not overlap
+    return ratio, significant
+
+
+def compare(baseline, current, threshold, loss_threshold, min_deltas=None):
+    """Compares the records of two result sets, returns the report.
+    min_deltas maps the measures, time and memory, to the smallest absolute
+    change which is reported."""
+    min_deltas = min_deltas or {}
+    report = {
+        "threshold": threshold,
+        "loss_threshold": loss_threshold,
+        "min_deltas": min_deltas,
+        "compared": 0,
+        "regressions": [],
+        "improvements": [],
+        "missing": [],
+        "new": [],
+    }
+    for key in sorted(set(baseline) - set(current)):
+        report["missing"].append({"model": key[0], "task": key[1]})
+    for key in sorted(set(current) - set(baseline)):
+        report["new"].append({"model": key[0], "task": key[1]})
+
+    for key in sorted(set(baseline) & set(current)):
+        model, task = key
+        base, cur = baseline[key], current[key]
+        report["compared"] += 1
+
+        if not results.succeeded(cur) or not results.succeeded(base):
+            if results.succeeded(base):
+                report["regressions"].append(
+                    {"model": model, "task": task, "metric": "status",
+                     "baseline": base["status"], "current": cur["status"]})
+            elif results.succeeded(cur):
+                report["improvements"].append(
+                    {"model": model, "task": task, "metric": "status",
+                     "baseline": base["status"], "current": cur["status"]})
+            continue
+
+        base_entries = dict((e["name"], e) for e in base["results"])
+        for entry in cur["results"]:
+            name = entry["name"]
+            if name not in base_entries:
+                continue
+            change = {"model": model, "task": task, "metric": name,
+                      "baseline": base_entries[name]["value"],
+                      "current": entry["value"]}
+
+            if name in PERFORMANCE_METRICS:
+                ratio, significant = compare_performance(
+                    base_entries[name], entry, threshold,
+                    min_deltas.get(entry.get("measure"), 0))
+                if not significant:
+                    continue
+                change["ratio"] = ratio
+                if ratio > 1:
+                    report["regressions"].append(change)
+                else:
+                    report["improvements"].append(change)
+
+            elif name in LOSS_METRICS:
+                base_rel = base_entries[name]["value"] / float(
+                    max(results.metrics(base)["synapses"], 1))
+                cur_rel = entry["value"] / float(
+                    max(results.metrics(cur)["synapses"], 1))
+                if abs(cur_rel - base_rel) <= loss_threshold:
+                    continue
+                change["relative_baseline"] = base_rel
+                change["relative_current"] = cur_rel
+                if cur_rel > base_rel:
+                    report["regressions"].append(change)
+                else:
+                    report["improvements"].append(change)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compares the benchmark results of two sweeps and exits '
+                    'with a non-zero status if the current sweep regressed.')
+    parser.add_argument('baseline', type=str,
+                        help='directory with the results of the baseline')
+    parser.add_argument('current', type=str,
+                        help='directory with the results to check')
+    parser.add_argument('--threshold', default=0.1, type=float,
+                        help='relative change of mapping time or memory '
+                             'which is reported')
+    parser.add_argument('--loss_threshold', default=0.005, type=float,
+                        help='change of the synapse loss relative to the '
+                             'number of synapses which is reported')
+    parser.add_argument('--min_time_delta', default=1.0, type=float,
+                        help='smallest change of a time in s which is '
+                             'reported')
+    parser.add_argument('--min_memory_delta', default=50.0, type=float,
+                        help='smallest change of the memory in MB which is '
+                             'reported')
+    parser.add_argument('--report', type=str,
+                        help='file to write the json report to')
+    args = parser.parse_args()
+
+    report = compare(load_results(args.baseline),
+                     load_results(args.current),
+                     args.threshold, args.loss_threshold,
+                     {"time": args.min_time_delta,
+                      "memory": args.min_memory_delta})
+    report["baseline"] = args.baseline
+    report["current"] = args.current
+
+    if args.report:
+        with open(args.report, 'w') as outfile:
+            json.dump(report, outfile, indent=2)
+
+    print("compared {} grid points, {} missing, {} new".format(
+        report["compared"], len(report["missing"]), len(report["new"])))
+    for kind in ["regressions", "improvements"]:
+        print("{}: {}".format(kind, len(report[kind])))
+        for change in report[kind]:
+            print("    {model} {task} {metric}: {baseline} -> {current}"
+                  .format(**change))
+
+    if report["regressions"]:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+"""History of the benchmark results in a sqlite database.
+
+    history.py ingest [directory ...]
+        adds the *_results.json records of the directories, records already
+        in the database are skipped
+    history.py query --model random30_network --task 'N1600_%' \\
+            --metric setup_time --days 90 --by toolchain
+        median, spread and date range of a metric per toolchain version,
+        git commit, host, slurm node or environment fingerprint, --series
+        lists every run
+"""
+
+import argparse
+from collections import defaultdict
+from datetime import datetime, timedelta
+import glob
+import json
+import os
+import sqlite3
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "mapping", "networks"))
+import results
+
+# environment entries stored as indexed columns
+ENVIRONMENT = ["git_commit", "host", "slurm_node", "toolchain",
+               "fingerprint"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    model TEXT NOT NULL,
+    task TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    status TEXT NOT NULL,
+    git_commit TEXT,
+    host TEXT,
+    slurm_node TEXT,
+    toolchain TEXT,
+    fingerprint TEXT,
+    record TEXT NOT NULL,
+    UNIQUE (model, task, timestamp)
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    run INTEGER NOT NULL REFERENCES runs (id),
+    name TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (run, name)
+);
+CREATE INDEX IF NOT EXISTS runs_model_task ON runs (model, task, timestamp);
+CREATE INDEX IF NOT EXISTS runs_toolchain ON runs (toolchain, timestamp);
+CREATE INDEX IF NOT EXISTS metrics_name ON metrics (name, run);
+"""
+
+
+def connect(filename):
+    connection = sqlite3.connect(filename)
+    connection.executescript(SCHEMA)
+    # databases created before an environment column was added
+    columns = [row[1] for row in
+               connection.execute("PRAGMA table_info(runs)")]
+    for key in ENVIRONMENT:
+        if key not in columns:
+            connection.execute(
+                "ALTER TABLE runs ADD COLUMN {} TEXT".format(key))
+    return connection
+
+
+def ingest(connection, records):
+    """Adds the records, the full record is kept as json next to the
+    indexed columns. Returns the number of new records."""
+    added = 0
+    with connection:
+        for record in records:
+            environment = record.get("environment", {})
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO runs (model, task, timestamp, status, "
+                "git_commit, host, slurm_node, toolchain, fingerprint, "
+                "record) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [record["model"], record["task"], record["timestamp"],
+                 record["status"]] +
+                [environment.get(key) for key in ENVIRONMENT] +
+                [json.dumps(record)])
+            if cursor.rowcount == 0:
+                continue
+            connection.executemany(
+                "INSERT INTO metrics (run, name, value) VALUES (?, ?, ?)",
+                [(cursor.lastrowid, name, value)
+                 for name, value in results.metrics(record).items()
+                 if isinstance(value, (int, float))])
+            added += 1
+    return added
+
+
+def records(connection, model):
+    """Returns the records of a model ordered by time"""
+    return [json.loads(record) for record, in connection.execute(
+        "SELECT record FROM runs WHERE model = ? ORDER BY timestamp",
+        [model])]
+
+
+def query(connection, model, metric, task="%", days=None, by="toolchain"):
+    """Returns (timestamp, group, value) of the successful runs of a model
+    whose task matches the sql LIKE pattern, ordered by time."""
+    sql = ("SELECT runs.timestamp, runs.{}, metrics.value FROM runs "
+           "JOIN metrics ON metrics.run = runs.id "
+           "WHERE runs.model = ? AND runs.task LIKE ? AND metrics.name = ? "
+           "AND runs.status = 'success'").format(by)
+    parameters = [model, task, metric]
+    if days is not None:
+        sql += " AND runs.timestamp >= ?"
+        parameters.append(
+            (datetime.now() - timedelta(days=days)).isoformat())
+    sql += " ORDER BY runs.timestamp"
+    return connection.execute(sql, parameters).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--database', default='history.sqlite',
+                        help='sqlite file of the history')
+    subparsers = parser.add_subparsers(dest='command')
+    ingestparser = subparsers.add_parser('ingest')
+    ingestparser.add_argument('directories', nargs='*', default=['.'])
+    queryparser = subparsers.add_parser('query')
+    queryparser.add_argument('--model', required=True)
+    queryparser.add_argument('--task', default='%',
+                             help='sql LIKE pattern of the task names')
+    queryparser.add_argument('--metric', default='setup_time')
+    queryparser.add_argument('--days', type=float,
+                             help='only runs of the last days')
+    queryparser.add_argument('--by', default='toolchain',
+                             choices=ENVIRONMENT + ['task'])
+    queryparser.add_argument('--series', action='store_true',
+                             help='list every run')
+    args = parser.parse_args()
+
+    connection = connect(args.database)
+    if args.command == 'ingest':
+        records = [results.load(filename)
+                   for directory in args.directories
+                   for filename in glob.glob(
+                       os.path.join(directory, "*_results.json"))]
+        print("Added {} of {} records to {}".format(
+            ingest(connection, records), len(records), args.database))
+    elif args.command == 'query':
+        rows = query(connection, args.model, args.metric, task=args.task,
+                     days=args.days, by=args.by)
+        groups = defaultdict(list)
+        for timestamp, group, value in rows:
+            groups[group].append((timestamp, value))
+            if args.series:
+                print("{} {:<40} {:g}".format(timestamp, str(group), value))
+        print("{} of {} ({} runs)".format(args.metric, args.model,
+                                          len(rows)))
+        # groups in the order of their first run
+        for group, runs in sorted(groups.items(), key=lambda item: item[1]):
+            values = [value for _, value in runs]
+            q1, median, q3 = np.percentile(values, [25, 50, 75])
+            print("    {:<40} runs {:>4} median {:>10.4g} iqr {:>10.4g} "
+                  "{} - {}".format(str(group), len(values), median, q3 - q1,
+                                   runs[0][0][:10], runs[-1][0][:10]))
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
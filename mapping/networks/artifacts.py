@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+"""Content addressed store of the mapping results persisted by marocco.
+
+Every run persists its mapping result, many reruns of a grid point produce
+identical files. The store keeps each distinct file once:
+
+    objects/ab/abcdef....xml.gz     file named by the sha256 of its content
+                                    and the format
+    index.sqlite                    runs referencing the objects
+
+If parse.py is given a store, it is passed to the benchmark scripts in the
+environment variable BENCHMARK_ARTIFACTS and results.Result moves the
+persisted file into the store when it writes its record. The record then
+refers to the object by its hash. The jobs only rename files into the store,
+which is atomic also on NFS, the index is written by parse.py on the
+submitting host after the sweep, as sqlite locks are unreliable on NFS.
+
+    artifacts.py --store artifacts add --model random30_network \\
+            results_random30_network_*.xml.gz
+        adds the files of earlier runs of a model, the task is taken from
+        the file name
+    artifacts.py --store artifacts index *_results.json
+        adds the runs of result records whose files were moved into the
+        store to the index, as parse.py does after a sweep
+    artifacts.py --store artifacts path random30_network N1600_nsize4
+        prints the file of the latest run of a grid point
+    artifacts.py --store artifacts evict --keep_last 3 --max_size 50
+        forgets all but the latest runs of every grid point and removes the
+        least recently used objects until the store is below 50 GB
+"""
+
+import argparse
+from datetime import datetime
+import glob
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+
+STORE = "BENCHMARK_ARTIFACTS"
+
+# formats marocco persists its results in, chosen by the file extension,
+# the binary archives are written and read considerably faster than xml
+FORMATS = ["xml.gz", "xml", "bin.gz", "bin"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    sha256 TEXT NOT NULL,
+    format TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_access TEXT NOT NULL,
+    PRIMARY KEY (sha256, format)
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    model TEXT NOT NULL,
+    task TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    format TEXT NOT NULL,
+    FOREIGN KEY (sha256, format) REFERENCES objects (sha256, format)
+);
+CREATE INDEX IF NOT EXISTS runs_model_task ON runs (model, task, timestamp);
+CREATE INDEX IF NOT EXISTS objects_last_access ON objects (last_access);
+"""
+
+
+def add_arguments(parser):
+    parser.add_argument('--persist_format', default='xml.gz', choices=FORMATS,
+                        help='format of the persisted mapping result')
+
+
+def filename(model, task, persist_format="xml.gz"):
+    """file marocco persists the mapping result of a run to"""
+    return "results_{}_{}.{}".format(model, task, persist_format)
+
+
+def split_filename(path):
+    """model_task and format of a persisted mapping result, see filename"""
+    name = os.path.basename(path)[len("results_"):]
+    for persist_format in sorted(FORMATS, key=len, reverse=True):
+        if name.endswith("." + persist_format):
+            return name[:-len(persist_format) - 1], persist_format
+    raise ValueError("{} is no persisted mapping result".format(path))
+
+
+def connect(store):
+    if not os.path.isdir(store):
+        os.makedirs(store)
+    # concurrent jobs wait for each other instead of failing
+    connection = sqlite3.connect(os.path.join(store, "index.sqlite"),
+                                 timeout=600)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def object_path(store, sha256, persist_format):
+    return os.path.join(store, "objects", sha256[:2],
+                        "{}.{}".format(sha256, persist_format))
+
+
+def digest(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as infile:
+        for block in iter(lambda: infile.read(1 << 20), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def move(store, path):
+    """Moves the file into the store without indexing it, see index, a file
+    whose content is stored already is removed. Returns the hash, the
+    format, the size and the path of the object."""
+    sha256 = digest(path)
+    _, persist_format = split_filename(path)
+    target = object_path(store, sha256, persist_format)
+    size = os.path.getsize(path)
+    if os.path.exists(target):
+        os.remove(path)
+    else:
+        directory = os.path.dirname(target)
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+        # the store may be on another file system, the file is copied to a
+        # temporary name next to the object and renamed atomically, a job
+        # storing the same content concurrently renames an identical file
+        handle, temporary = tempfile.mkstemp(prefix=".incoming_",
+                                             dir=directory)
+        os.close(handle)
+        shutil.move(path, temporary)
+        os.rename(temporary, target)
+    return {"sha256": sha256, "format": persist_format, "size": size,
+            "path": target}
+
+
+def index(store, records):
+    """Adds the runs of result records with stored artifacts to the index,
+    runs indexed already are skipped. Returns the number of added runs."""
+    added = 0
+    now = datetime.now().isoformat()
+    connection = connect(store)
+    with connection:
+        for record in records:
+            stored = record.get("artifacts") or (
+                [record["artifact"]] if "artifact" in record else [])
+            for artifact in stored:
+                # records of earlier versions lack the format
+                persist_format = artifact.get("format") or \
+                    split_filename(artifact["path"])[1]
+                run = [record["model"], record["task"], record["timestamp"],
+                       artifact["sha256"], persist_format]
+                if connection.execute(
+                        "SELECT 1 FROM runs WHERE model = ? AND task = ? AND "
+                        "timestamp = ? AND sha256 = ? AND format = ?",
+                        run).fetchone():
+                    continue
+                connection.execute(
+                    "INSERT OR REPLACE INTO objects (sha256, format, size, "
+                    "last_access) VALUES (?, ?, ?, ?)",
+                    [artifact["sha256"], persist_format, artifact["size"],
+                     now])
+                connection.execute(
+                    "INSERT INTO runs (model, task, timestamp, sha256, "
+                    "format) VALUES (?, ?, ?, ?, ?)", run)
+                added += 1
+    connection.close()
+    return added
+
+
+def add(store, path, model, task):
+    """Moves the file into the store and indexes it as run of the grid
+    point, see move."""
+    artifact = move(store, path)
+    index(store, [{"model": model, "task": task,
+                   "timestamp": datetime.now().isoformat(),
+                   "artifact": artifact}])
+    return artifact
+
+
+def path(store, model, task):
+    """file of the latest run of the grid point, None if none is stored"""
+    connection = connect(store)
+    with connection:
+        row = connection.execute(
+            "SELECT sha256, format FROM runs WHERE model = ? AND task = ? "
+            "ORDER BY timestamp DESC LIMIT 1", [model, task]).fetchone()
+        if row is None:
+            return None
+        connection.execute(
+            "UPDATE objects SET last_access = ? WHERE sha256 = ? AND "
+            "format = ?", [datetime.now().isoformat()] + list(row))
+    connection.close()
+    return object_path(store, *row)
+
+
+def evict(store, keep_last=None, max_size=None):
+    """
+        Forgets all but the keep_last latest runs of every grid point and
+        removes the objects no run refers to. Afterwards the least recently
+        used objects and their runs are removed until the objects take at
+        most max_size bytes. Returns the number and size of the removed
+        objects.
+    """
+    connection = connect(store)
+    with connection:
+        if keep_last is not None:
+            connection.execute(
+                "DELETE FROM runs WHERE id IN (SELECT id FROM ("
+                "SELECT id, ROW_NUMBER() OVER (PARTITION BY model, task "
+                "ORDER BY timestamp DESC) AS age FROM runs) WHERE age > ?)",
+                [keep_last])
+        referenced = ("EXISTS (SELECT 1 FROM runs WHERE runs.sha256 = "
+                      "objects.sha256 AND runs.format = objects.format)")
+        removed = connection.execute(
+            "SELECT sha256, format, size FROM objects WHERE NOT " +
+            referenced).fetchall()
+        if max_size is not None:
+            kept = [row for row in connection.execute(
+                "SELECT sha256, format, size FROM objects WHERE " +
+                referenced + " ORDER BY last_access DESC")]
+            total = 0
+            for row in kept:
+                total += row[2]
+                if total > max_size:
+                    removed.append(row)
+        for sha256, persist_format, _ in removed:
+            for table in ["runs", "objects"]:
+                connection.execute(
+                    "DELETE FROM {} WHERE sha256 = ? AND format = ?".format(
+                        table), [sha256, persist_format])
+            target = object_path(store, sha256, persist_format)
+            if os.path.exists(target):
+                os.remove(target)
+    connection.close()
+    return len(removed), sum(size for _, _, size in removed)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('--store', default='artifacts',
+                        help='directory of the store')
+    subparsers = parser.add_subparsers(dest='command')
+    addparser = subparsers.add_parser('add')
+    addparser.add_argument('--model', required=True)
+    addparser.add_argument('files', nargs='+')
+    indexparser = subparsers.add_parser('index')
+    indexparser.add_argument('files', nargs='+',
+                             help='result records of the runs')
+    pathparser = subparsers.add_parser('path')
+    pathparser.add_argument('model')
+    pathparser.add_argument('task')
+    evictparser = subparsers.add_parser('evict')
+    evictparser.add_argument('--keep_last', type=int,
+                             help='runs kept per grid point')
+    evictparser.add_argument('--max_size', type=float,
+                             help='size budget of the store in GB')
+    args = parser.parse_args()
+
+    if args.command == 'add':
+        prefix = args.model + "_"
+        for pattern in args.files:
+            for persisted in glob.glob(pattern):
+                # model and task names both contain underscores, see
+                # filename
+                name, _ = split_filename(persisted)
+                if not name.startswith(prefix):
+                    parser.error("{} is no result of {}".format(
+                        persisted, args.model))
+                print(add(args.store, persisted, args.model,
+                          name[len(prefix):])["path"])
+    elif args.command == 'index':
+        records = []
+        for pattern in args.files:
+            for filename in glob.glob(pattern):
+                with open(filename) as infile:
+                    records.append(json.load(infile))
+        print("Indexed {} runs".format(index(args.store, records)))
+    elif args.command == 'path':
+        print(path(args.store, args.model, args.task))
+    elif args.command == 'evict':
+        max_size = None
+        if args.max_size is not None:
+            max_size = int(args.max_size * 1024 ** 3)
+        count, size = evict(args.store, args.keep_last, max_size)
+        print("Removed {} objects, {:.2f} GB".format(count, size / 1024. ** 3))
+    else:
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Capacity estimates of a network computed before the mapping.
+
+The connectivity is analysed with vectorized operations on the connection
+index arrays, which takes seconds where the mapping takes minutes. The
+estimates assume every neuron is placed on n_size denmems, half of them in
+the top and half in the bottom synapse array of a HICANN. A neuron then has
+SYNAPSES_PER_DENMEM synapses per denmem; inputs beyond that are lost in any
+placement. Packing the neurons onto HICANNs in index order gives the number
+of synapse drivers a HICANN needs at least.
+
+The estimate is written by a separate run of a benchmark script with
+--capacity_only, see analyse, so that it adds nothing to the timings of the
+mapping runs.
+"""
+
+import json
+
+import numpy as np
+
+# synapse rows of a synapse array, each denmem has one column of synapses,
+# a synapse driver serves two of the rows
+SYNAPSES_PER_DENMEM = 224
+DENMEMS_PER_HICANN = 512
+
+# directories of the benchmark scripts accepting --capacity_only
+MODELS = ["cortical", "fullyVisibleBM", "rbm", "rbmLocalReceptive",
+          "synthetic"]
+
+
+def add_arguments(parser):
+    parser.add_argument('--capacity_only', action='store_true',
+                        help='only write the capacity estimate of the '
+                             'network as {name}_{task}_capacity.json')
+
+
+def all_to_all(pre, post, allow_self_connections=True):
+    """sources and targets of an all-to-all projection between populations
+    of pre and post neurons"""
+    sources, targets = np.meshgrid(np.arange(pre), np.arange(post),
+                                   indexing='ij')
+    sources, targets = sources.ravel(), targets.ravel()
+    if not allow_self_connections:
+        keep = sources != targets
+        sources, targets = sources[keep], targets[keep]
+    return sources, targets
+
+
+def histogram(values):
+    """histogram in powers of two bins [0, 1), [1, 2), [2, 4), ..."""
+    top = int(np.max(values)) if len(values) else 0
+    edges = np.concatenate(([0], 2 ** np.arange(
+        int(np.ceil(np.log2(top + 1))) + 1)))
+    counts, edges = np.histogram(values, bins=edges)
+    return {"edges": edges.tolist(), "counts": counts.tolist()}
+
+
+def summary(values):
+    return {"mean": float(np.mean(values)) if len(values) else 0.,
+            "max": int(np.max(values)) if len(values) else 0,
+            "histogram": histogram(values)}
+
+
+def statistics(sizes, projections, n_size):
+    """
+        Analyses the connectivity of a network.
+
+        Keywords:
+            --- sizes: number of neurons of each population
+            --- projections: iterable of (source population, target
+                population, sources, targets), the sources and targets
+                are index arrays within the populations
+            --- n_size: denmems per neuron
+
+        Returns a json serialisable dict with the degree distributions, the
+        number of distinct source populations per neuron and the estimates.
+    """
+    offsets = np.concatenate(([0], np.cumsum(sizes)))
+    neurons = int(offsets[-1])
+    indegree = np.zeros(neurons, dtype=np.int64)
+    outdegree = np.zeros(neurons, dtype=np.int64)
+    # targets reached by each pair of populations, as several projections,
+    # e.g. excitatory and inhibitory, may connect the same pair
+    reached = {}
+    for source, target, sources, targets in projections:
+        indegree[offsets[target]:offsets[target + 1]] += np.bincount(
+            targets, minlength=sizes[target])
+        outdegree[offsets[source]:offsets[source + 1]] += np.bincount(
+            sources, minlength=sizes[source])
+        mask = reached.setdefault((source, target),
+                                  np.zeros(sizes[target], dtype=bool))
+        mask[targets] = True
+    source_populations = np.zeros(neurons, dtype=np.int64)
+    for (source, target), mask in reached.items():
+        source_populations[offsets[target]:offsets[target + 1]] += mask
+
+    capacity = SYNAPSES_PER_DENMEM * n_size
+    excess = np.maximum(indegree - capacity, 0)
+    # the synapses of a neuron are split evenly between its columns in the
+    # top and bottom array, the rows of an array are shared by its neurons
+    rows = -(-indegree // n_size)
+    hicann = np.arange(neurons) // (DENMEMS_PER_HICANN // n_size)
+    drivers = np.zeros(hicann[-1] + 1 if neurons else 0, dtype=np.int64)
+    np.maximum.at(drivers, hicann, rows)
+
+    return {
+        "neurons": neurons,
+        "synapses": int(indegree.sum()),
+        "indegree": summary(indegree),
+        "outdegree": summary(outdegree),
+        "source_populations": summary(source_populations),
+        "n_size": n_size,
+        "synapse_capacity": capacity,
+        "overfull_neurons": int(np.count_nonzero(excess)),
+        # lower bound of the synapse loss
+        "excess_synapses": int(excess.sum()),
+        "hicanns": len(drivers),
+        "synapse_drivers": summary(drivers),
+        # more rows than drivers is equivalent to exceeding the capacity
+        "exceeds": bool(excess.any()),
+    }
+
+
+def analyse(result, network, args, marocco):
+    """With --capacity_only, writes the estimate of the network, whose
+    connectivity() gives the arguments of statistics, and returns True, the
+    script then stops before building the network. Otherwise the analysis is
+    skipped, as it would add to the timings and peak memory of the run."""
+    if not args.capacity_only:
+        return False
+    result.enter("analysis")
+    n_size = args.n_size or marocco.neuron_placement.default_neuron_size()
+    result.metadata["capacity"] = statistics(*network.connectivity(),
+                                             n_size=n_size)
+    write(result.model, result.task, result.metadata["capacity"])
+    return True
+
+
+def write(model, task, estimate):
+    """writes the estimate of a --capacity_only run"""
+    with open("{}_{}_capacity.json".format(model, task), 'w') as outfile:
+        json.dump(estimate, outfile, indent=2)
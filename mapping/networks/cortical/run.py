@@ -1,9 +1,10 @@
 #!/usr/bin/env python
 
 import argparse
-from datetime import datetime
-import json
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
+import os
+import sys
 
 import pyhmf as pynn
 import pyhalco_hicann_v2 as C
@@ -15,16 +16,23 @@ init_logger("ERROR", [])
 
 import params as par
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+import artifacts
+import capacity
+import results
+import strategies
+
 import pylogging
 logger = pylogging.get("column-benchmark")
 
-# At the moment only the deflaut placement strategy is tested. Can be added later to test different strategy
-from pymarocco_runtime import ClusterByPopulationConnectivity as placer_pop
-from pymarocco_runtime import ClusterByNeuronConnectivity as placer_neuron_cluster
-from pymarocco_runtime import byNeuronBlockEnumAndPopulationIDasc as placer_enum_IDasc
+# estimated size of one connection as python list [source, target, weight,
+# delay] passed to the FromListConnector, in bytes
+BYTES_PER_CONNECTION = 200
 
 class CorticalNetwork(object):
-    def __init__(self, marocco, scale, k_scale, seed):
+    def __init__(self, marocco, scale, k_scale, seed, chunk_size=None,
+                 threads=1):
 
         # total connection counter
         self.totalConnections = 0
@@ -40,6 +48,13 @@ class CorticalNetwork(object):
 
         self.seed = seed
 
+        # maximal number of connections passed to pyhmf at once, projections
+        # with more connections are created as several projections, which
+        # changes the network marocco maps, see the task name
+        self.chunk_size = chunk_size
+        # threads drawing the connections
+        self.threads = threads
+
         pynn.setup(marocco=self.marocco)
 
     def get_indegrees(self):
@@ -65,64 +80,92 @@ class CorticalNetwork(object):
                 num_neurons.append(par.num_neurons[layer][key])
         return num_neurons
 
-    def build(self):
-        # set populations
-        self.populations = {}
-
+    def generate(self):
+        """
+        draws the connections of all projections in a pool of threads, numpy
+        releases the GIL while drawing. The projections are registered with
+        pyhmf one after another by build.
+        """
         # calculate indegrees from connection probability
         self.indegrees = self.get_indegrees()
 
+        self.sizes = {}
         for layer, exIn in par.num_neurons.items():
             # [:1] to remove the first "L"
-            self.populations[layer[1:] + "e"] = pynn.Population(
-                int(exIn["E"] * self.scale), self.model)
-            self.populations[layer[1:] + "i"] = pynn.Population(
-                int(exIn["I"] * self.scale), self.model)
+            self.sizes[layer[1:] + "e"] = int(exIn["E"] * self.scale)
+            self.sizes[layer[1:] + "i"] = int(exIn["I"] * self.scale)
 
-        # Create projections
-        self.projections = []
-        self.projectionLabels = []
+        # independent random stream of each projection, indexed like the
+        # indegrees, so that they do not depend on each other
+        seeds = np.random.SeedSequence(self.seed).spawn(len(par.label) ** 2)
 
+        jobs = []
         for targetIndex, targetPop in enumerate(par.label):
             for sourceIndex, sourcePop in enumerate(par.label):
-
-                if sourcePop.endswith("e"):
-                    target = "excitatory"
-                else:
-                    target = "inhibitory"
-
-                sourceSize = self.populations[sourcePop].size
-                targetSize = self.populations[targetPop].size
-
                 # In-degree scaling as described in Albada et al. (2015) "Scalability of Asynchronous Networks
                 # Is Limited by One-to-One Mapping between Effective Connectivity and Correlations"
                 # Number of inputs per target neuron (in-degree) for full scale model is scaled with k_scale
                 # To receive total connection number it is multiplied with downscaled target population size (scale)
                 # Connection probability is not preserved if scale == k_scale (multiple connections neglected)
-                n_connection = int(round(self.indegrees[targetIndex][sourceIndex] * self.k_scale * targetSize))
+                n_connection = int(round(self.indegrees[targetIndex][sourceIndex] * self.k_scale * self.sizes[targetPop]))
                 self.totalConnections += n_connection
                 if(n_connection == 0):
                     continue
+                jobs.append((sourcePop, targetPop, n_connection,
+                             seeds[targetIndex * len(par.label) + sourceIndex]))
 
-                # connection matrix [(neuron_pop1,neuron_pop2,weight,delay),(...)]
-                matrix = np.zeros((4, n_connection),dtype= float)
-                np.random.seed(self.seed)
-                matrix[0] = np.random.randint(0, sourceSize, n_connection)
-                matrix[1] = np.random.randint(0, targetSize, n_connection)
+        with ThreadPoolExecutor(max_workers=self.threads) as pool:
+            self.connections = list(pool.map(self.draw_connections, jobs))
+        print("total connections:", self.totalConnections)
 
-                # The delay and weight is not important for mapping
-                # PyNN requires it to be set to some value
-                matrix[2] = np.repeat(1, n_connection) # arbitrary weight
-                matrix[3] = np.repeat(0, n_connection) # arbitrary delay
-                matrix = matrix.T
-                matrix = [[int(a),int(b),c,d] for a,b,c,d in matrix]
-                connector = pynn.FromListConnector(matrix)
+    def draw_connections(self, job):
+        """
+        draws the sources and targets of a projection from separate streams
+        spawned from its SeedSequence, as int32 to halve the memory
+        """
+        sourcePop, targetPop, n_connection, seed = job
+        sourceRng, targetRng = [np.random.default_rng(s)
+                                for s in seed.spawn(2)]
+        sources = sourceRng.integers(0, self.sizes[sourcePop], n_connection)
+        targets = targetRng.integers(0, self.sizes[targetPop], n_connection)
+        return (sourcePop, targetPop, sources.astype(np.int32),
+                targets.astype(np.int32))
+
+    def connectivity(self):
+        """population sizes and drawn connections, see capacity.py"""
+        index = dict((label, i) for i, label in enumerate(self.sizes))
+        return (list(self.sizes.values()),
+                [(index[sourcePop], index[targetPop], sources, targets)
+                 for sourcePop, targetPop, sources, targets
+                 in self.connections])
 
-                self.projections.append(pynn.Projection(
-                    self.populations[sourcePop], self.populations[targetPop], connector, target=target, label=sourcePop + "-" + targetPop))
+    def build(self):
+        # set populations
+        self.populations = {}
+        for label, size in self.sizes.items():
+            self.populations[label] = pynn.Population(size, self.model)
 
-                self.projectionLabels.append(sourcePop + "-" + targetPop)
-        print("total connections:", self.totalConnections)
+        # Create projections
+        self.projections = []
+        self.projectionLabels = []
+
+        for sourcePop, targetPop, sources, targets in self.connections:
+            if sourcePop.endswith("e"):
+                target = "excitatory"
+            else:
+                target = "inhibitory"
+
+            label = sourcePop + "-" + targetPop
+            for block in self.connection_blocks(sources, targets):
+                connector = pynn.FromListConnector(block)
+                self.projections.append(pynn.Projection(
+                    self.populations[sourcePop], self.populations[targetPop], connector, target=target, label=label))
+                self.projectionLabels.append(label)
+                # pyhmf keeps its own copy, the python objects of a block
+                # are released before the next one is converted
+                del block, connector
+        # the arrays are not needed after the registration
+        self.connections = None
 
         # external input:
         self.externalInputPops = {}
@@ -153,13 +196,30 @@ class CorticalNetwork(object):
                     sourcePop, self.populations[sourceKey], externalConnector, target="excitatory"))
                 self.projectionLabels.append("ext.-" + targetPop)
 
+    def connection_blocks(self, sources, targets):
+        """
+        yields the connections of a projection in blocks of at most
+        chunk_size connections as lists [(source, target, weight, delay)]
+        """
+        chunk_size = self.chunk_size or len(sources)
+        for start in range(0, len(sources), chunk_size):
+            size = min(chunk_size, len(sources) - start)
+            # The delay and weight is not important for mapping
+            # PyNN requires it to be set to some value
+            yield list(zip(sources[start:start + size].tolist(),
+                           targets[start:start + size].tolist(),
+                           [1.] * size, [0.] * size))
+
     def getLoss(self, marocco):
         perPopulation = {}
-        for i in range(len(self.projections)):
+        # the blocks of a chunked projection share its label
+        for proj, label in zip(self.projections, self.projectionLabels):
             synLoss, totalSyn = self.projectionwise_synapse_loss(
-                self.projections[i], marocco)
-            perPopulation[self.projectionLabels[i]] = {
-                "synLoss": synLoss, "TotalSyns": totalSyn}
+                proj, marocco)
+            loss = perPopulation.setdefault(label,
+                                            {"synLoss": 0, "TotalSyns": 0})
+            loss["synLoss"] += synLoss
+            loss["TotalSyns"] += totalSyn
 
         return perPopulation
 
@@ -200,8 +260,6 @@ def main():
     parser = argparse.ArgumentParser()
     # scale factor of the whole network compared to the original one
     parser.add_argument('--scale', default=0.01, type=float)
-    # size of one neueron in hw neurons
-    parser.add_argument('--n_size', default=4, type=int)
     parser.add_argument('--k_scale', type=float)  # scale of connections
 
     # wafer defects that should be considered in the mapping
@@ -214,23 +272,43 @@ def main():
                         default = False, const=True)
     parser.add_argument('--name', type=str,
                         default='cortical_column_network')  # name
-    parser.add_argument('--placer', type=str, default='byNeuron')
+    # minimize_as_possible is now the default of marocco
+    strategies.add_arguments(parser, placer='byNeuron',
+                             merger_routing='minimize_as_possible', n_size=4)
+    artifacts.add_arguments(parser)
+    capacity.add_arguments(parser)
     parser.add_argument('--seed', default=0, type=int)
+    parser.add_argument('--chunk_size', type=int,
+                        help='maximal number of connections passed to pyhmf '
+                             'at once, larger projections are split into '
+                             'several projections, marked in the task name')
+    # the cpus slurm allocated to the job
+    parser.add_argument('--threads', type=int,
+                        default=len(os.sched_getaffinity(0)),
+                        help='threads drawing the connections')
+    parser.add_argument('--chunk_memory', type=int,
+                        help='memory in MB a block of connections passed to '
+                             'pyhmf may take, sets chunk_size unless given. '
+                             'It does not limit the memory of the job, which '
+                             'is left to slurm')
+    results.add_arguments(parser)
     args = parser.parse_args()
 
     # k_scale is set to "scale" by deflaut
     if not args.k_scale:
         args.k_scale = args.scale
 
-    taskname = "scale{}_k-scale{}_nsize{}_wafer{}_ignoreBlacklsiting{}".format(
+    if args.chunk_memory and not args.chunk_size:
+        args.chunk_size = \
+            args.chunk_memory * 1024 * 1024 // BYTES_PER_CONNECTION
+
+    taskname = "scale{}_k-scale{}_wafer{}_ignoreBlacklsiting{}".format(
         args.scale,
         args.k_scale,
-        args.n_size,
         args.wafer,
         args.ignore_blacklisting)
 
     marocco = PyMarocco()
-    marocco.neuron_placement.default_neuron_size(args.n_size)
 
     if(args.ignore_blacklisting):
         marocco.defects.backend = Defects.Backend.Without
@@ -252,112 +330,66 @@ def main():
         marocco.defects.path = "/wang/data/commissioning/BSS-1/rackplace/" + str(
             args.wafer) + "/derived_plus_calib_blacklisting/current"
 
+    # chunked projections are a different network for marocco, their
+    # results are not comparable to those of single projections
+    if args.chunk_size:
+        taskname += "_chunk{}".format(args.chunk_size)
+
     # c 4189 no specification
     #taskname += "_c4189_"
 
-    # strategy
-    marocco.merger_routing.strategy(  # is now default
-        marocco.merger_routing.minimize_as_possible)
-    #taskname += "_minimAsPoss"
-
-    '''
-    # placement strategy
-    user_strat = placer()
-    taskname += "_placer"
-    '''
-
-    if args.placer == "byNeuron":
-        user_strat = placer_neuron_cluster()  # cluster by neurons
-        taskname += "_byNeuron"
-        marocco.neuron_placement.default_placement_strategy(user_strat)
-
-    if args.placer == "byEnum":
-        user_strat = placer_enum_IDasc()  # cluster by neurons
-        taskname += "_byEnum"
-        marocco.neuron_placement.default_placement_strategy(user_strat)
-
-    if args.placer == "constrained":
-        # needed for 5720 with patch set 36(best results) or ps 50
-        from pymarocco_runtime import ConstrainedNeuronClusterer as placer_neuron_resizer
-
-        user_strat = placer_neuron_resizer()
-        taskname += "_constrained"
-        marocco.neuron_placement.default_placement_strategy(user_strat)
-
-    # give marocco the format of the results file
-    taskname += str(datetime.now())
-    marocco.persist = "results_{}_{}.xml.gz".format(
-        args.name, taskname)
-
-    start = datetime.now()
-    r = CorticalNetwork(marocco, scale=args.scale, k_scale=args.k_scale, seed = args.seed)
-    r.build()
-    mid = datetime.now()
+    # neuron size, placement and merger routing strategy
+    taskname += strategies.configure(marocco, args.placer, args.merger_routing,
+                                     args.n_size)
+
+    # give marocco the file of the results, the extension selects the format,
+    # the task name identifies the grid point, reruns overwrite the result
+    marocco.persist = artifacts.filename(args.name, taskname,
+                                         args.persist_format)
+
+    result = results.Result(
+        args.name, taskname,
+        marocco=marocco, profile=args.profile,
+        scale=args.scale,
+        k_scale=args.k_scale,
+        n_size=args.n_size,
+        wafer=args.wafer,
+        ignore_blacklisting=args.ignore_blacklisting,
+        placer=args.placer,
+        merger_routing=args.merger_routing,
+        seed=args.seed,
+        chunk_size=args.chunk_size,
+        chunk_memory=args.chunk_memory,
+        threads=args.threads)
     try:
+        result.enter("generate")
+        r = CorticalNetwork(marocco, scale=args.scale, k_scale=args.k_scale, seed = args.seed,
+                            chunk_size=args.chunk_size, threads=args.threads)
+        r.generate()
+        if capacity.analyse(result, r, args, marocco):
+            return
+        result.enter("build")
+        r.build()
+        result.enter("mapping")
         r.run()
-        totsynapses = marocco.stats.getSynapses()
-        totneurons = marocco.stats.getNumNeurons()
-        lostsynapses = marocco.stats.getSynapseLoss()
-        lostsynapsesl1 = marocco.stats.getSynapseLossAfterL1Routing()
-        perPopulation = r.getLoss(marocco)
+        result.collect_statistics(marocco)
+        result.metadata["perPopulation"] = r.getLoss(marocco)
+        totsynapses = result.value("synapses")
+        lostsynapses = result.value("synapse_loss")
         print("Losses: ", lostsynapses, " of ", totsynapses, " L1Loss:",
-              lostsynapsesl1, " Relative:", lostsynapses / float(totsynapses))
-
-    except RuntimeError as err:
-        # couldn't place all populations
-        totsynapses = 1
-        totneurons = 1
-        lostsynapses = 1
-        lostsynapsesl1 = 1
+              result.value("synapse_loss_after_l1"), " Relative:",
+              lostsynapses / float(totsynapses))
+
+    except (RuntimeError, MemoryError) as err:
+        # couldn't place all populations or ran out of memory
+        result.fail(err)
         logger.error(err)
-    end = datetime.now()
-    print("time:", end - start)
-    result = {
-        "model": args.name,
-        "task": taskname,
-        "scale": args.scale,
-        "k_scale": args.k_scale,
-        "n_size": args.n_size,
-        "wafer": args.wafer,
-        "ignore_blacklisting": args.ignore_blacklisting,
-        "timestamp": datetime.now().isoformat(),
-        "placer": args.placer,
-        "perPopulation": perPopulation,
-        "results": [
-            {"type": "performance",
-             "name": "setup_time",
-             "value": (end - mid).total_seconds(),
-             "units": "s",
-             "measure": "time"
-             },
-            {"type": "performance",
-             "name": "total_time",
-             "value": (end - start).total_seconds(),
-             "units": "s",
-             "measure": "time"
-             },
-            {"type": "performance",
-             "name": "synapses",
-             "value": totsynapses
-             },
-            {"type": "performance",
-             "name": "neurons",
-             "value": totneurons
-             },
-            {"type": "performance",
-             "name": "synapse_loss",
-             "value": lostsynapses
-             },
-            {"type": "performance",
-             "name": "synapse_loss_after_l1",
-             "value": lostsynapsesl1
-             }
-        ]
-    }
-
-    with open("{}_{}_results.json".format(result["model"], result["task"]),
-              'w') as outfile:
-        json.dump(result, outfile)
+    result.finish()
+    print("time:", result.value("total_time"))
+    result.write()
+
+    if result.failed:
+        sys.exit(results.EXIT_FAILED)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+"""Exports the results in the current directory to a static html dashboard.
+
+The dashboard directory contains
+    summary.json    pre-aggregated statistics per model, placer and wafer
+    series/*.json   all runs of a model as columns, one file per model
+    index.html      the dashboard, it loads the series of a model lazily
+Each json file is accompanied by a .js file assigning the same data, which
+the dashboard loads with script tags, so that it works without a web server.
+"""
+
+import argparse
+from collections import defaultdict
+import glob
+import json
+import os
+import shutil
+
+import numpy as np
+
+import results
+
+# parameters of a run shown as filters in the dashboard
+FILTERS = ["wafer", "placer", "n_size"]
+METRICS = ["synapses", "neurons", "synapse_loss", "synapse_loss_after_l1",
+           "denmems", "denmem_usage", "mergers", "setup_time", "total_time",
+           "max_memory"]
+
+
+def write_data(directory, name, data):
+    """writes data as name.json and as name.js for the dashboard"""
+    with open(os.path.join(directory, name + ".json"), 'w') as outfile:
+        json.dump(data, outfile)
+    with open(os.path.join(directory, name + ".js"), 'w') as outfile:
+        outfile.write("dashboard.receive({}, {});\n".format(
+            json.dumps(name), json.dumps(data)))
+
+
+def series(records):
+    """returns the runs of a model as dict of columns"""
+    columns = defaultdict(list)
+    for record in sorted(records, key=lambda r: r["timestamp"]):
+        values = results.metrics(record)
+        columns["task"].append(record["task"])
+        columns["timestamp"].append(record["timestamp"])
+        columns["status"].append(record["status"])
+        # filters compare strings, as in the summary
+        for key in FILTERS:
+            columns[key].append(str(record.get(key)))
+        for key in METRICS:
+            columns[key].append(values.get(key))
+        if values.get("synapses"):
+            columns["relative_loss"].append(
+                values["synapse_loss"] / float(values["synapses"]))
+        else:
+            columns["relative_loss"].append(None)
+    return dict(columns)
+
+
+def summary(records):
+    """returns the number of runs and failures and the median metrics for
+    each combination of placer and wafer of a model"""
+    groups = defaultdict(list)
+    for record in records:
+        groups[(str(record.get("placer")), str(record.get("wafer")))].append(
+            record)
+    rows = []
+    for (placer, wafer), group in sorted(groups.items()):
+        succeeded = [results.metrics(r) for r in group
+                     if results.succeeded(r)]
+        row = {"placer": placer, "wafer": wafer, "runs": len(group),
+               "failed": len(group) - len(succeeded),
+               "latest": max(r["timestamp"] for r in group)}
+        for key in ["total_time", "max_memory"]:
+            values = [v[key] for v in succeeded if key in v]
+            row["median_" + key] = float(np.median(values)) if values \
+                else None
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--output', default='dashboard', type=str,
+                        help='directory the dashboard is written to')
+    args = parser.parse_args()
+
+    records = defaultdict(list)
+    for filename in glob.glob('*_results.json'):
+        record = results.load(filename)
+        records[record["model"]].append(record)
+
+    seriesdir = os.path.join(args.output, "series")
+    if not os.path.isdir(seriesdir):
+        os.makedirs(seriesdir)
+
+    models = {}
+    for model, modelrecords in sorted(records.items()):
+        write_data(seriesdir, model, series(modelrecords))
+        models[model] = {
+            "runs": len(modelrecords),
+            "filters": dict(
+                (key, sorted(set(str(r.get(key)) for r in modelrecords)))
+                for key in FILTERS),
+            "first": min(r["timestamp"] for r in modelrecords),
+            "latest": max(r["timestamp"] for r in modelrecords),
+            "groups": summary(modelrecords),
+        }
+    write_data(args.output, "summary", {"metrics": METRICS + ["relative_loss"],
+                                        "filters": FILTERS,
+                                        "models": models})
+
+    shutil.copy(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "dashboard.html"),
+                os.path.join(args.output, "index.html"))
+    print("Saved dashboard of {} models in {}".format(
+        len(models), os.path.join(args.output, "index.html")))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""Environment a benchmark ran in.
+
+Every result record stores where and with which code it was measured, so
+that changes of the performance can be attributed to changes of the
+toolchain, of the benchmarks or of the machine, see history.py. The
+fingerprint is a hash of everything which determines the outcome of a
+mapping, runs with the same fingerprint and arguments are interchangeable.
+"""
+
+import hashlib
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+from datetime import datetime
+
+# modules of the toolchain whose builds are recorded if they are loaded
+PACKAGES = ["pymarocco", "pyhmf", "pyhalco_hicann_v2", "pysthal", "numpy"]
+
+# entries which do not change the outcome of a mapping
+VOLATILE = ["host", "slurm_node", "slurm_job", "cpu", "cgroup", "threads"]
+
+# the environment is collected once per process
+_collected = {}
+
+
+def git_commit(directory):
+    """commit of the repository containing directory with a -dirty suffix
+    if there are local changes, None if it is not in a git repository"""
+    with open(os.devnull, 'w') as devnull:
+        try:
+            commit = subprocess.check_output(
+                ["git", "rev-parse", "HEAD"], cwd=directory,
+                stderr=devnull).decode().strip()
+            dirty = subprocess.call(["git", "diff", "--quiet", "HEAD"],
+                                    cwd=directory, stdout=devnull,
+                                    stderr=devnull) != 0
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    return commit + ("-dirty" if dirty else "")
+
+
+def toolchain():
+    """the container the benchmark runs in, or else the loaded module of
+    the software stack, None if neither is known"""
+    container = os.environ.get("SINGULARITY_CONTAINER")
+    if container:
+        # resolves links like latest to the dated container
+        return os.path.realpath(container)
+    modules = [module for module in
+               os.environ.get("LOADEDMODULES", "").split(":")
+               if module.startswith("nmpm_software")]
+    return modules[0] if modules else None
+
+
+def packages():
+    """version, location and build time of the loaded toolchain modules,
+    the builds of the toolchain carry no version numbers"""
+    builds = {}
+    for name in PACKAGES:
+        module = sys.modules.get(name)
+        if module is None or not getattr(module, "__file__", None):
+            continue
+        path = os.path.realpath(module.__file__)
+        builds[name] = {
+            "version": getattr(module, "__version__", None),
+            "path": path,
+            "modified": datetime.fromtimestamp(
+                os.path.getmtime(path)).isoformat(),
+        }
+    return builds
+
+
+def directory_hash(path):
+    """sha1 of the names and contents of the files below path, None if it
+    does not exist"""
+    if not path or not os.path.isdir(path):
+        return None
+    digest = hashlib.sha1()
+    for directory, subdirectories, filenames in os.walk(path):
+        subdirectories.sort()
+        for filename in sorted(filenames):
+            filename = os.path.join(directory, filename)
+            digest.update(os.path.relpath(filename, path).encode())
+            with open(filename, 'rb') as infile:
+                for block in iter(lambda: infile.read(1 << 20), b""):
+                    digest.update(block)
+    return digest.hexdigest()
+
+
+def cpu():
+    model = None
+    try:
+        with open("/proc/cpuinfo") as cpuinfo:
+            for line in cpuinfo:
+                if line.startswith("model name"):
+                    model = line.partition(":")[2].strip()
+                    break
+    except IOError:
+        pass
+    return {"model": model,
+            "machine": platform.machine(),
+            "count": os.cpu_count(),
+            # cpus the process may run on, as bound by slurm
+            "usable": len(os.sched_getaffinity(0))}
+
+
+def _read(filename):
+    try:
+        with open(filename) as infile:
+            return infile.read().strip()
+    except IOError:
+        return None
+
+
+def cgroup():
+    """cpu and memory limits of the cgroup of the process, None if there
+    are none. Supports cgroup v2 and the cpu and memory controllers of v1."""
+    paths = {}
+    for line in (_read("/proc/self/cgroup") or "").splitlines():
+        _, controllers, path = line.split(":", 2)
+        for controller in controllers.split(","):
+            paths[controller] = path
+
+    def find(controller, filename):
+        # within containers the cgroup of the process is mounted as root
+        for path in [paths.get(controller, "/"), "/"]:
+            value = _read(os.path.join("/sys/fs/cgroup", controller,
+                                       path.lstrip("/"), filename))
+            if value is not None:
+                return value
+        return None
+
+    cpus = memory = None
+    if "" in paths:
+        # cgroup v2, "max" means no limit
+        quota = (find("", "cpu.max") or "max").split()
+        if quota[0] != "max":
+            cpus = int(quota[0]) / float(quota[1])
+        limit = find("", "memory.max")
+        if limit and limit != "max":
+            memory = int(limit)
+    quota, period = find("cpu", "cpu.cfs_quota_us"), \
+        find("cpu", "cpu.cfs_period_us")
+    if quota and period and int(quota) > 0:
+        cpus = int(quota) / float(period)
+    limit = find("memory", "memory.limit_in_bytes")
+    # v1 reports a huge number if there is no limit
+    if limit and int(limit) < 1 << 62:
+        memory = int(limit)
+    return {"cpus": cpus, "memory": memory}
+
+
+def fingerprint(environment):
+    """hash of the entries of the environment which determine the mapping"""
+    stable = dict((key, value) for key, value in environment.items()
+                  if key not in VOLATILE)
+    return hashlib.sha1(json.dumps(stable, sort_keys=True).encode()
+                        ).hexdigest()
+
+
+def collect(defects_path=None, calib_path=None):
+    """Returns the environment of the process. It is collected once for
+    each defects and calibration path, as hashing the defects takes a
+    moment."""
+    key = (defects_path, calib_path)
+    if key not in _collected:
+        environment = {
+            "git_commit": git_commit(
+                os.path.dirname(os.path.abspath(__file__))),
+            "host": socket.gethostname(),
+            # only set within slurm jobs
+            "slurm_node": os.environ.get("SLURMD_NODENAME"),
+            "slurm_job": os.environ.get("SLURM_JOB_ID"),
+            "toolchain": toolchain(),
+            "python": platform.python_version(),
+            "packages": packages(),
+            "defects": {"path": defects_path,
+                        "sha1": directory_hash(defects_path)},
+            # the calibration is versioned by links to dated directories
+            "calibration": os.path.realpath(calib_path) if calib_path
+            else None,
+            "cpu": cpu(),
+            "cgroup": cgroup(),
+            "threads": dict((name, os.environ.get(name)) for name in
+                            ["OMP_NUM_THREADS", "SLURM_CPUS_PER_TASK"]),
+        }
+        environment["fingerprint"] = fingerprint(environment)
+        _collected[key] = environment
+    return _collected[key]
@@ -0,0 +1,44 @@
+"""Structured event stream of a benchmark sweep.
+
+parse.py and the benchmark scripts it starts append one json object per line
+to the file named by the environment variable BENCHMARK_EVENTS, so that a
+sweep can be monitored while it runs:
+
+    queued, started, finished   parse.py, per job with status and log file
+    phase                       results.Result.enter in the benchmark script
+    failed                      results.Result.fail with the traceback
+
+Every event holds the time, the host, the process and the job, which
+parse.py passes to its children as BENCHMARK_JOB. Without BENCHMARK_EVENTS
+no events are written.
+"""
+
+from datetime import datetime
+import fcntl
+import json
+import os
+import socket
+
+EVENTS = "BENCHMARK_EVENTS"
+JOB = "BENCHMARK_JOB"
+
+
+def emit(event, **fields):
+    filename = os.environ.get(EVENTS)
+    if not filename:
+        return
+    entry = {"time": datetime.now().isoformat(),
+             "event": event,
+             "job": os.environ.get(JOB),
+             "host": socket.gethostname(),
+             "pid": os.getpid()}
+    entry.update(fields)
+    # appends of jobs on several hosts may tear each other's lines on a
+    # network file system, the lock serialises them
+    with open(filename, 'a') as outfile:
+        fcntl.flock(outfile, fcntl.LOCK_EX)
+        try:
+            outfile.write(json.dumps(entry) + "\n")
+            outfile.flush()
+        finally:
+            fcntl.flock(outfile, fcntl.LOCK_UN)
@@ -1,11 +1,9 @@
 #!/usr/bin/env python
 
 import argparse
-from datetime import datetime
+import os
 import sys
 
-import json
-
 import pyhmf as pynn
 import pymarocco
 from pymarocco import Defects
@@ -14,14 +12,22 @@ import pyhalco_hicann_v2 as C
 from pysthal.command_line_util import init_logger
 init_logger("WARN", [])
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+import artifacts
+import results
+import strategies
+
 
 class FeedforwardNetwork(object):
-    def __init__(self, num_layers, conn_prob, neurons_per_layer, marocco, model=pynn.EIF_cond_exp_isfa_ista):
+    def __init__(self, num_layers, conn_prob, neurons_per_layer, marocco, model=pynn.EIF_cond_exp_isfa_ista,
+                 seed=42):
         self.neurons_per_layer = neurons_per_layer
         self.num_layers = num_layers
         self.conn_prob = conn_prob
         self.model = model
         self.marocco = marocco
+        self.seed = seed
 
         pynn.setup(marocco=self.marocco)
 
@@ -42,7 +48,7 @@ class FeedforwardNetwork(object):
                 self.neurons[i],
                 connector,
                 target='excitatory',
-                rng=pynn.NativeRNG(42))
+                rng=pynn.NativeRNG(self.seed))
 
     def run(self):
         pynn.run(1.)
@@ -57,6 +63,11 @@ def main():
     parser.add_argument('--name', default="feedforward_layered_network", type=str)
     parser.add_argument('--defects_path', type=str)
     parser.add_argument('--wafer', '-w', type=int, default=24)
+    parser.add_argument('--seed', default=42, type=int,
+                        help='seed of the random connectivity')
+    strategies.add_arguments(parser)
+    artifacts.add_arguments(parser)
+    results.add_arguments(parser)
 
     args = parser.parse_args()
 
@@ -76,69 +87,38 @@ def main():
         marocco.defects.path = "/wang/data/commissioning/BSS-1/rackplace/" + str(
             args.wafer) + "/derived_plus_calib_blacklisting/current"
 
-    marocco.persist = "results_{}_{}.xml.gz".format(args.name, taskname)
-
-    start = datetime.now()
-    r = FeedforwardNetwork(args.num_layers, args.conn_prob, args.neurons_per_layer, marocco)
-    r.build()
-    mid = datetime.now()
+    taskname += strategies.configure(marocco, args.placer, args.merger_routing,
+                                     args.n_size)
+    marocco.persist = artifacts.filename(args.name, taskname,
+                                         args.persist_format)
+
+    result = results.Result(args.name, taskname, marocco=marocco,
+                            profile=args.profile,
+                            seed=args.seed, wafer=args.wafer,
+                            placer=args.placer,
+                            merger_routing=args.merger_routing,
+                            n_size=args.n_size)
     try:
+        result.enter("build")
+        r = FeedforwardNetwork(args.num_layers, args.conn_prob, args.neurons_per_layer, marocco,
+                               seed=args.seed)
+        r.build()
+        result.enter("mapping")
         r.run()
-        totsynapses = marocco.stats.getSynapses()
-        totneurons = marocco.stats.getNumNeurons()
-        lostsynapses = marocco.stats.getSynapseLoss()
-        lostsynapsesl1 = marocco.stats.getSynapseLossAfterL1Routing()
-    except RuntimeError:
+        result.collect_statistics(marocco)
+    except RuntimeError as err:
         # couldn't place all populations
-        totsynapses = 1
-        totneurons = 1
-        lostsynapses = 1
-        lostsynapsesl1 = 1
-
-    end = datetime.now()
-
-    result = {
-        "model": args.name,
-        "task": taskname,
-        "timestamp": datetime.now().isoformat(),
-        "results": [
-            {"type": "performance",
-             "name": "setup_time",
-             "value": (end - mid).total_seconds(),
-             "units": "s",
-             "measure": "time"
-             },
-            {"type": "performance",
-             "name": "total_time",
-             "value": (end - start).total_seconds(),
-             "units": "s",
-             "measure": "time"
-             },
-            {"type": "performance",
-             "name": "synapses",
-             "value": totsynapses
-             },
-            {"type": "performance",
-             "name": "neurons",
-             "value": totneurons
-             },
-            {"type": "performance",
-             "name": "synapse_loss",
-             "value": lostsynapses
-             },
-            {"type": "performance",
-             "name": "synapse_loss_after_l1",
-             "value": lostsynapsesl1
-             },
-        ],
-    }
-
-    with open("{}_{}_results.json".format(result["model"], result["task"]),
-              'w') as outfile:
-        json.dump(result, outfile)
+        result.fail(err)
+    result.finish()
+    result.write()
+
+    if result.failed:
+        sys.exit(results.EXIT_FAILED)
 
+    lostsynapses = result.value("synapse_loss")
     print("{}\n{}\nSynapses lost: {}; L1 synapses lost: {}; relative synapse lost: {}".format(
-        sys.argv, taskname, lostsynapses, lostsynapsesl1, float(lostsynapses) / totsynapses))
+        sys.argv, taskname, lostsynapses, result.value("synapse_loss_after_l1"),
+        float(lostsynapses) / result.value("synapses")))
 
 if __name__ == '__main__':
     main()
@@ -1,8 +1,8 @@
 #!/usr/bin/env python
 
 import argparse
-from datetime import datetime
-import json
+import os
+import sys
 
 import pyhmf as pynn
 import pymarocco
@@ -12,6 +12,13 @@ import pyhalco_hicann_v2 as C
 from pysthal.command_line_util import init_logger
 init_logger("WARN", [])
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+import artifacts
+import capacity
+import results
+import strategies
+
 
 class fullyVisibleBmNetwork(object):
     def __init__(self, N, marocco, model=pynn.EIF_cond_exp_isfa_ista):
@@ -21,6 +28,13 @@ class fullyVisibleBmNetwork(object):
 
         pynn.setup(marocco=self.marocco)
 
+    def connectivity(self):
+        """population sizes and connections as built, see capacity.py"""
+        connections = capacity.all_to_all(self.N, self.N,
+                                          allow_self_connections=False)
+        # an excitatory and an inhibitory projection
+        return [self.N], [(0, 0) + connections] * 2
+
     def build(self):
 
         # Set the neurons
@@ -53,6 +67,13 @@ def main():
     parser.add_argument('--name', default="fullyVisibleBm_network", type=str)
     parser.add_argument('--defects_path', type=str)
     parser.add_argument('--wafer', '-w', type=int, default=24)
+    parser.add_argument('--seed', default=42, type=int,
+                        help='stored in the result only, the connectivity of '
+                             'this model is deterministic')
+    strategies.add_arguments(parser)
+    artifacts.add_arguments(parser)
+    capacity.add_arguments(parser)
+    results.add_arguments(parser)
 
     args = parser.parse_args()
 
@@ -71,66 +92,34 @@ def main():
         marocco.defects.path = "/wang/data/commissioning/BSS-1/rackplace/" + str(
             args.wafer) + "/derived_plus_calib_blacklisting/current"
 
-    marocco.persist = "results_{}_{}.xml.gz".format(args.name, taskname)
-
-    start = datetime.now()
-    r = fullyVisibleBmNetwork(args.N, marocco)
-    r.build()
-    mid = datetime.now()
+    taskname += strategies.configure(marocco, args.placer, args.merger_routing,
+                                     args.n_size)
+    marocco.persist = artifacts.filename(args.name, taskname,
+                                         args.persist_format)
+
+    result = results.Result(args.name, taskname, marocco=marocco,
+                            profile=args.profile,
+                            seed=args.seed, wafer=args.wafer,
+                            placer=args.placer,
+                            merger_routing=args.merger_routing,
+                            n_size=args.n_size)
     try:
+        result.enter("build")
+        r = fullyVisibleBmNetwork(args.N, marocco)
+        if capacity.analyse(result, r, args, marocco):
+            return
+        r.build()
+        result.enter("mapping")
         r.run()
-        totsynapses = marocco.stats.getSynapses()
-        totneurons = marocco.stats.getNumNeurons()
-        lostsynapses = marocco.stats.getSynapseLoss()
-        lostsynapsesl1 = marocco.stats.getSynapseLossAfterL1Routing()
-    except RuntimeError:
+        result.collect_statistics(marocco)
+    except RuntimeError as err:
         # couldn't place all populations
-        totsynapses = 1
-        totneurons = 1
-        lostsynapses = 1
-        lostsynapsesl1 = 1
-
-    end = datetime.now()
-
-    result = {
-        "model": args.name,
-        "task": taskname,
-        "timestamp": datetime.now().isoformat(),
-        "results": [
-            {"type": "performance",
-             "name": "setup_time",
-             "value": (end - mid).total_seconds(),
-             "units": "s",
-             "measure": "time"
-             },
-            {"type": "performance",
-             "name": "total_time",
-             "value": (end - start).total_seconds(),
-             "units": "s",
-             "measure": "time"
-             },
-            {"type": "performance",
-             "name": "synapses",
-             "value": totsynapses
-             },
-            {"type": "performance",
-             "name": "neurons",
-             "value": totneurons
-             },
-            {"type": "performance",
-             "name": "synapse_loss",
-             "value": lostsynapses
-             },
-            {"type": "performance",
-             "name": "synapse_loss_after_l1",
-             "value": lostsynapsesl1
-             }
-        ]
-    }
-
-    with open("{}_{}_results.json".format(result["model"], result["task"]),
-              'w') as outfile:
-        json.dump(result, outfile)
+        result.fail(err)
+    result.finish()
+    result.write()
+
+    if result.failed:
+        sys.exit(results.EXIT_FAILED)
 
 
 if __name__ == '__main__':
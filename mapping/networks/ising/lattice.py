@@ -0,0 +1,33 @@
+"""Vectorized nearest neighbour lattice of the Ising network."""
+
+import numpy as np
+
+
+def nearest_neighbours(linearsize, dimension, periodic=True):
+    """
+        Connections of a hypercubic lattice with linearsize neurons along
+        each of its dimension axes, every neuron connects to its two
+        neighbours along each axis. The neurons are numbered in C order of
+        their coordinates. With periodic boundaries the neighbours wrap
+        around, otherwise neurons on the surface have fewer neighbours.
+
+        Returns the index arrays of sources and targets, grouped by axis and
+        direction. Only the loop over the 2 * dimension directions remains.
+    """
+    shape = (linearsize,) * dimension
+    neurons = np.arange(linearsize ** dimension)
+    coordinates = np.array(np.unravel_index(neurons, shape))
+    sources = []
+    targets = []
+    for axis in range(dimension):
+        for step in [1, -1]:
+            shifted = coordinates.copy()
+            shifted[axis] += step
+            if periodic:
+                shifted[axis] %= linearsize
+                keep = slice(None)
+            else:
+                keep = (shifted[axis] >= 0) & (shifted[axis] < linearsize)
+            sources.append(neurons[keep])
+            targets.append(np.ravel_multi_index(shifted[:, keep], shape))
+    return np.concatenate(sources), np.concatenate(targets)
@@ -1,8 +1,8 @@
 #!/usr/bin/env python
 
 import argparse
-from datetime import datetime
-import json
+import os
+import sys
 
 import pyhmf as pynn
 import pyhalco_hicann_v2 as C
@@ -12,11 +12,23 @@ from pymarocco import Defects
 from pysthal.command_line_util import init_logger
 init_logger("WARN", [])
 
+import lattice
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+import artifacts
+import results
+import strategies
+
+# version 2 builds the lattice as a single population instead of one
+# population per neuron, the mapping of the versions is not comparable
+VERSION = 2
+
 
 class IsingNetwork(object):
     def __init__(self, marocco, linearsize, dimension, kbiasneurons,
-                 nbiasneurons, nsources, ksources, duplicates, sourcerate,
-                 model=pynn.IF_cond_exp):
+                 nbiasneurons, nsources, ksources, duplicates, periodic=True,
+                 model=pynn.IF_cond_exp, seed=42):
         # size of the edge of the lattice
         self.linearsize = linearsize
         # dimension of the lattice
@@ -34,17 +46,21 @@ class IsingNetwork(object):
         self.ksources = ksources
         # number of connections between neighboring neurons
         self.duplicates = duplicates
+        # whether the lattice wraps around at its boundaries
+        self.periodic = periodic
         self.model = model
         self.marocco = marocco
+        # seed of the random connections from noise and bias neurons
+        self.seed = seed
 
         pynn.setup(marocco=self.marocco)
 
     def build(self):
-        weights = self._create_nn_unit_weights(self.linearsize,
-                                               self.dimension)
+        sources, targets = lattice.nearest_neighbours(
+            self.linearsize, self.dimension, periodic=self.periodic)
 
-        self.neurons = [pynn.Population(1, self.model)
-                        for _ in range(self.linearsize ** self.dimension)]
+        self.neurons = pynn.Population(self.linearsize ** self.dimension,
+                                       self.model)
         self.noise = pynn.Population(self.nsources, pynn.IF_cond_exp)
         self.biasneurons = pynn.Population(self.nbiasneurons, self.model)
 
@@ -65,13 +81,13 @@ class IsingNetwork(object):
                 self.neurons,
                 connector,
                 target='excitatory',
-                rng=pynn.NativeRNG(42))
+                rng=pynn.NativeRNG(self.seed))
         pynn.Projection(
                 self.noise,
                 self.neurons,
                 connector,
                 target='inhibitory',
-                rng=pynn.NativeRNG(43))
+                rng=pynn.NativeRNG(self.seed + 1))
 
         connector = pynn.FixedNumberPreConnector(
                 n=self.kbiasneurons,
@@ -81,13 +97,17 @@ class IsingNetwork(object):
                 self.neurons,
                 connector,
                 target='inhibitory',
-                rng=pynn.NativeRNG(44))
-
-        for ipre, ipost, w in weights:
-            connector = pynn.AllToAllConnector(weights=1)
+                rng=pynn.NativeRNG(self.seed + 2))
+
+        # the connector keeps a single connection per pair of neurons,
+        # each duplicate of the lattice is a projection of its own
+        connector = pynn.FromListConnector(
+            list(zip(sources.tolist(), targets.tolist(),
+                     [1.] * len(sources), [0.] * len(sources))))
+        for _ in range(self.duplicates):
             pynn.Projection(
-                self.neurons[ipre],
-                self.neurons[ipost],
+                self.neurons,
+                self.neurons,
                 connector,
                 target="excitatory"
             )
@@ -96,20 +116,6 @@ class IsingNetwork(object):
         pynn.run(1)
         pynn.end()
 
-    def _create_nn_unit_weights(self, linearsize=10, dimension=2):
-        # returns list of lists for weights and ndarray for bias
-        weights = []
-        for nid in range(linearsize**dimension):
-            connlist = [(nid + o) % (linearsize**(d + 1)) +
-                        int(nid / linearsize**(d + 1)) * linearsize**(d + 1)
-                        for d in range(dimension)
-                        for o in [linearsize**d, -linearsize**d]
-                        ]
-            for connid in connlist:
-                weights.append((nid, connid, 1.))
-
-        return weights
-
 
 def main():
     parser = argparse.ArgumentParser()
@@ -119,11 +125,21 @@ def main():
     parser.add_argument('--nbiasneurons', '-nb', type=int, default=1)
     parser.add_argument('--nsources', '-n', type=int, default=500)
     parser.add_argument('--ksources', '-k', type=int, default=5)
-    parser.add_argument('--sourcerate', '-r', type=float, default=20.)
-    parser.add_argument('--duplicates', '-p', type=int, default=1)
+    parser.add_argument('--sourcerate', '-r', type=float, default=20.,
+                        help='stored in the result only, the mapping does '
+                             'not depend on the rates')
+    parser.add_argument('--duplicates', '-p', type=int, default=1,
+                        help='number of connections between neighbours')
+    parser.add_argument('--open_boundaries', action='store_true',
+                        help='do not wrap the lattice around')
     parser.add_argument('--wafer', '-w', type=int, default=24)
+    parser.add_argument('--seed', default=42, type=int,
+                        help='seed of the random connectivity')
     parser.add_argument('--name', type=str, default='ising_network')
     parser.add_argument('--defects_path', type=str)
+    strategies.add_arguments(parser)
+    artifacts.add_arguments(parser)
+    results.add_arguments(parser)
 
     args = parser.parse_args()
 
@@ -136,6 +152,9 @@ def main():
                                                         args.ksources,
                                                         args.duplicates,
                                                         args.wafer)
+    if args.open_boundaries:
+        taskname += "_open"
+    taskname += "_v{}".format(VERSION)
 
     marocco = pymarocco.PyMarocco()
     marocco.continue_despite_synapse_loss = True
@@ -150,73 +169,44 @@ def main():
         marocco.defects.path = "/wang/data/commissioning/BSS-1/rackplace/" + str(
             args.wafer) + "/derived_plus_calib_blacklisting/current"
 
-    marocco.persist = "results_{}_{}.xml.gz".format(args.name, taskname)
-
-    start = datetime.now()
-    r = IsingNetwork(marocco,
-                     linearsize=args.linearsize,
-                     dimension=args.dimension,
-                     nbiasneurons=args.nbiasneurons,
-                     kbiasneurons=args.kbiasneurons,
-                     nsources=args.nsources,
-                     ksources=args.ksources,
-                     sourcerate=args.sourcerate,
-                     duplicates=args.duplicates)
-    r.build()
-    mid = datetime.now()
+    taskname += strategies.configure(marocco, args.placer, args.merger_routing,
+                                     args.n_size)
+    marocco.persist = artifacts.filename(args.name, taskname,
+                                         args.persist_format)
+
+    result = results.Result(args.name, taskname, marocco=marocco,
+                            profile=args.profile,
+                            seed=args.seed, wafer=args.wafer,
+                            placer=args.placer,
+                            merger_routing=args.merger_routing,
+                            n_size=args.n_size,
+                            sourcerate=args.sourcerate,
+                            periodic=not args.open_boundaries,
+                            model_version=VERSION)
     try:
+        result.enter("build")
+        r = IsingNetwork(marocco,
+                         linearsize=args.linearsize,
+                         dimension=args.dimension,
+                         nbiasneurons=args.nbiasneurons,
+                         kbiasneurons=args.kbiasneurons,
+                         nsources=args.nsources,
+                         ksources=args.ksources,
+                         duplicates=args.duplicates,
+                         periodic=not args.open_boundaries,
+                         seed=args.seed)
+        r.build()
+        result.enter("mapping")
         r.run()
-        totsynapses = marocco.stats.getSynapses()
-        totneurons = marocco.stats.getNumNeurons()
-        lostsynapses = marocco.stats.getSynapseLoss()
-        lostsynapsesl1 = marocco.stats.getSynapseLossAfterL1Routing()
-    except RuntimeError:
+        result.collect_statistics(marocco)
+    except RuntimeError as err:
         # couldn't place all populations
-        totsynapses = 1
-        totneurons = 1
-        lostsynapses = 1
-        lostsynapsesl1 = 1
-    end = datetime.now()
-
-    result = {
-        "model": args.name,
-        "task": taskname,
-        "timestamp": datetime.now().isoformat(),
-        "results": [
-            {"type": "performance",
-             "name": "setup_time",
-             "value": (end-mid).total_seconds(),
-             "units": "s",
-             "measure": "time"
-             },
-            {"type": "performance",
-             "name": "total_time",
-             "value": (end-start).total_seconds(),
-             "units": "s",
-             "measure": "time"
-             },
-            {"type": "performance",
-             "name": "synapses",
-             "value": totsynapses
-             },
-            {"type": "performance",
-             "name": "neurons",
-             "value": totneurons
-             },
-            {"type": "performance",
-             "name": "synapse_loss",
-             "value": lostsynapses
-             },
-            {"type": "performance",
-             "name": "synapse_loss_after_l1",
-             "value": lostsynapsesl1
-             }
-        ]
-    }
-
-    with open("{}_{}_results.json".format(result["model"], result["task"]),
-              'w') as outfile:
-        json.dump(result, outfile)
+        result.fail(err)
+    result.finish()
+    result.write()
+
+    if result.failed:
+        sys.exit(results.EXIT_FAILED)
 
 
 if __name__ == '__main__':
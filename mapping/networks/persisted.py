@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+"""Streaming reader of the mapping results persisted by marocco.
+
+Loading a persisted result through marocco reads the whole mapping into
+memory, although most analyses only count a few things. The boost xml
+archives are read incrementally here instead: the entries of a section,
+e.g. the placement or the l1_routing, are yielded one by one as nested
+dicts and dropped afterwards, so that the memory does not grow with the
+size of the result.
+
+    persisted.py --processes 8 results_*.xml.gz
+        statistics of the hicann occupancy and of the route lengths of every
+        file, written to persisted_statistics.json
+
+The tags of the archive are the names marocco serializes its members with,
+they are options of the statistics, so that they can be adapted if the
+serialization of marocco changes. Binary archives can only be read through
+marocco.
+"""
+
+import argparse
+from collections import Counter
+from functools import partial
+import gzip
+import json
+import multiprocessing as mp
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+import capacity
+
+# bookkeeping of the boost serialization of containers
+BOOKKEEPING = ["count", "item_version"]
+
+
+def open_result(filename):
+    if filename.endswith(".gz"):
+        return gzip.open(filename, 'rb')
+    return open(filename, 'rb')
+
+
+def value(text):
+    """number or string of a leaf of the archive"""
+    text = (text or "").strip()
+    for convert in [int, float]:
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+
+def convert(element):
+    """Converts an element into nested dicts, the items of a container are
+    stored as list under "items", repeated tags as list."""
+    children = list(element)
+    if not children:
+        return value(element.text)
+    entry = {}
+    for child in children:
+        if child.tag in BOOKKEEPING:
+            continue
+        if child.tag == "item":
+            entry.setdefault("items", []).append(convert(child))
+        elif child.tag in entry:
+            if not isinstance(entry[child.tag], list):
+                entry[child.tag] = [entry[child.tag]]
+            entry[child.tag].append(convert(child))
+        else:
+            entry[child.tag] = convert(child)
+    return entry
+
+
+def items(filename, section):
+    """
+        Yields the entries of a section of a persisted result as nested
+        dicts, see convert. The section is a tag or a path of tags like
+        "l1_routing/m_routes", its entries are the outermost items below
+        it. Every element is removed from its parent once it has been read,
+        which keeps the memory constant. Raises a ValueError if the archive
+        has no such section.
+    """
+    parts = section.split("/")
+    stack = []
+    section_depth = None
+    item_depth = None
+    with open_result(filename) as infile:
+        for event, element in ET.iterparse(infile, events=("start", "end")):
+            if event == "start":
+                stack.append(element)
+                if section_depth is None:
+                    if [e.tag for e in stack[-len(parts):]] == parts:
+                        section_depth = len(stack)
+                elif item_depth is None and element.tag == "item":
+                    item_depth = len(stack)
+                continue
+            depth = len(stack)
+            stack.pop()
+            if item_depth is not None and depth > item_depth:
+                # part of an entry, removed with the entry
+                continue
+            if depth == item_depth and element.tag == "item":
+                yield convert(element)
+            if depth == section_depth:
+                return
+            if stack:
+                stack[-1].remove(element)
+    if section_depth is None:
+        raise ValueError("{} has no section {}".format(filename, section))
+
+
+def find(entry, key):
+    """yields all values stored under key anywhere in the entry"""
+    if isinstance(entry, list):
+        for item in entry:
+            for found in find(item, key):
+                yield found
+    elif isinstance(entry, dict):
+        for name, item in entry.items():
+            if name == key:
+                yield item
+            else:
+                for found in find(item, key):
+                    yield found
+
+
+def occupancy(filename, section="placement", key="hicann"):
+    """number of placed entries per hicann, the hicann of an entry is the
+    first value stored under key"""
+    counts = Counter()
+    entries = 0
+    for entry in items(filename, section):
+        entries += 1
+        hicann = next(find(entry, key), None)
+        if hicann is not None:
+            counts[json.dumps(hicann, sort_keys=True)] += 1
+    return {"entries": entries,
+            "hicanns": len(counts),
+            "per_hicann": capacity.summary(
+                np.array(list(counts.values()), dtype=np.int64))}
+
+
+def mergers(filename, section="placement", key="dnc_merger"):
+    """number of distinct DNC mergers the placed entries send their events
+    through, the merger of an entry is the first value stored under key,
+    entries without one, e.g. neurons without an L1 address, are skipped.
+    Raises a ValueError if no entry has a merger, e.g. if marocco serializes
+    it under another tag, rather than counting none."""
+    used = set()
+    for entry in items(filename, section):
+        merger = next(find(entry, key), None)
+        if merger is not None:
+            used.add(json.dumps(merger, sort_keys=True))
+    if not used:
+        raise ValueError("{} has no {} in its {}".format(
+            filename, key, section))
+    return len(used)
+
+
+def route_lengths(filename, section="l1_routing", key="route"):
+    """number of segments of every route stored under key"""
+    lengths = []
+    for entry in items(filename, section):
+        for route in find(entry, key):
+            if isinstance(route, dict):
+                lengths.append(len(route.get("items", [])))
+    return {"routes": len(lengths),
+            "length": capacity.summary(np.array(lengths, dtype=np.int64))}
+
+
+def statistics(filename, options):
+    return filename, {
+        "occupancy": occupancy(filename, options["placement"],
+                               options["hicann_key"]),
+        "routes": route_lengths(filename, options["routing"],
+                                options["route_key"]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument('files', nargs='+',
+                        help='persisted results in xml or xml.gz format')
+    parser.add_argument('--processes', type=int, default=1,
+                        help='files read in parallel')
+    parser.add_argument('--placement', default='placement',
+                        help='section of the placed neurons')
+    parser.add_argument('--hicann_key', default='hicann',
+                        help='tag of the hicann of a placed neuron')
+    parser.add_argument('--routing', default='l1_routing',
+                        help='section of the l1 routes')
+    parser.add_argument('--route_key', default='route',
+                        help='tag of a route of the l1 routing')
+    parser.add_argument('--output', default='persisted_statistics.json')
+    args = parser.parse_args()
+
+    analyse = partial(statistics, options=vars(args))
+    if args.processes > 1:
+        pool = mp.Pool(processes=args.processes)
+        found = dict(pool.imap_unordered(analyse, args.files))
+        pool.close()
+    else:
+        found = dict(analyse(filename) for filename in args.files)
+    for filename in args.files:
+        occupied = found[filename]["occupancy"]
+        routes = found[filename]["routes"]
+        print("{}: {} placed on {} hicanns (max {}), {} routes of mean "
+              "length {:.2f} (max {})".format(
+                  filename, occupied["entries"], occupied["hicanns"],
+                  occupied["per_hicann"]["max"], routes["routes"],
+                  routes["length"]["mean"], routes["length"]["max"]))
+    with open(args.output, 'w') as outfile:
+        json.dump(found, outfile, indent=2)
+
+
+if __name__ == '__main__':
+    main()
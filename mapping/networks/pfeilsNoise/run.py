@@ -1,8 +1,8 @@
 #!/usr/bin/env python
 
 import argparse
-from datetime import datetime
-import json
+import os
+import sys
 
 import pyhmf as pynn
 import pymarocco
@@ -12,20 +12,29 @@ from pymarocco import Defects
 from pysthal.command_line_util import init_logger
 init_logger("WARN", [])
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+import artifacts
+import results
+import strategies
+
 
 class pfeilsNoiseNetwork(object):
-    def __init__(self, N, K, marocco, model=pynn.EIF_cond_exp_isfa_ista):
+    def __init__(self, N, K, marocco, model=pynn.EIF_cond_exp_isfa_ista,
+                 seed=42):
         """
             Class to create a noise Network following Pfeil et. al. 2016.
 
             Keywords:
                 --- N: number of neuons
                 --- K: number of presynaptic partners per neuron
+                --- seed: seed of the random connectivity
         """
         self.N = N
         self.K = K
         self.model = model
         self.marocco = marocco
+        self.seed = seed
 
         pynn.setup(marocco=self.marocco)
 
@@ -41,7 +50,7 @@ class pfeilsNoiseNetwork(object):
                         self.neurons,
                         connector,
                         target='excitatory',
-                        rng=pynn.NativeRNG(42))
+                        rng=pynn.NativeRNG(self.seed))
 
     def run(self):
         pynn.run(1)
@@ -55,6 +64,11 @@ def main():
     parser.add_argument('--name', default="random_network", type=str)
     parser.add_argument('--defects_path', type=str)
     parser.add_argument('--wafer', '-w', type=int, default=24)
+    parser.add_argument('--seed', default=42, type=int,
+                        help='seed of the random connectivity')
+    strategies.add_arguments(parser)
+    artifacts.add_arguments(parser)
+    results.add_arguments(parser)
 
     args = parser.parse_args()
 
@@ -73,66 +87,32 @@ def main():
         marocco.defects.path = "/wang/data/commissioning/BSS-1/rackplace/" + str(
             args.wafer) + "/derived_plus_calib_blacklisting/current"
 
-    marocco.persist = "results_{}_{}.xml.gz".format(args.name, taskname)
-
-    start = datetime.now()
-    r = pfeilsNoiseNetwork(args.N, args.K, marocco)
-    r.build()
-    mid = datetime.now()
+    taskname += strategies.configure(marocco, args.placer, args.merger_routing,
+                                     args.n_size)
+    marocco.persist = artifacts.filename(args.name, taskname,
+                                         args.persist_format)
+
+    result = results.Result(args.name, taskname, marocco=marocco,
+                            profile=args.profile,
+                            seed=args.seed, wafer=args.wafer,
+                            placer=args.placer,
+                            merger_routing=args.merger_routing,
+                            n_size=args.n_size)
     try:
+        result.enter("build")
+        r = pfeilsNoiseNetwork(args.N, args.K, marocco, seed=args.seed)
+        r.build()
+        result.enter("mapping")
         r.run()
-        totsynapses = marocco.stats.getSynapses()
-        totneurons = marocco.stats.getNumNeurons()
-        lostsynapses = marocco.stats.getSynapseLoss()
-        lostsynapsesl1 = marocco.stats.getSynapseLossAfterL1Routing()
-    except RuntimeError:
+        result.collect_statistics(marocco)
+    except RuntimeError as err:
         # couldn't place all populations
-        totsynapses = 1
-        totneurons = 1
-        lostsynapses = 1
-        lostsynapsesl1 = 1
-
-    end = datetime.now()
-
-    result = {
-        "model": args.name,
-        "task": taskname,
-        "timestamp": datetime.now().isoformat(),
-        "results": [
-            {"type": "performance",
-             "name": "setup_time",
-             "value": (end - mid).total_seconds(),
-             "units": "s",
-             "measure": "time"
-             },
-            {"type": "performance",
-             "name": "total_time",
-             "value": (end - start).total_seconds(),
-             "units": "s",
-             "measure": "time"
-             },
-            {"type": "performance",
-             "name": "synapses",
-             "value": totsynapses
-             },
-            {"type": "performance",
-             "name": "neurons",
-             "value": totneurons
-             },
-            {"type": "performance",
-             "name": "synapse_loss",
-             "value": lostsynapses
-             },
-            {"type": "performance",
-             "name": "synapse_loss_after_l1",
-             "value": lostsynapsesl1
-             }
-        ]
-    }
-
-    with open("{}_{}_results.json".format(result["model"], result["task"]),
-              'w') as outfile:
-        json.dump(result, outfile)
+        result.fail(err)
+    result.finish()
+    result.write()
+
+    if result.failed:
+        sys.exit(results.EXIT_FAILED)
 
 
 if __name__ == '__main__':
@@ -5,45 +5,75 @@ import matplotlib.pyplot as plt
 from matplotlib.backends.backend_pdf import PdfPages
 import numpy as np
 import plotColumnInOnePlot
+import results
+import scaling
 
-import json
 import glob
+import json
 
 from collections import defaultdict
 
 
 data = {}
+failed = defaultdict(int)
 
 xkeys = ['neurons', 'synapses']
 ykeys_loss = ['synapse_loss', 'synapse_loss_after_l1']
 ykeys_time = ['setup_time', 'total_time']
+# not stored by older results
+ykeys_memory = ['max_memory']
+ykeys_denmems = ['denmem_usage']
 
-for jsfile in glob.glob('*.json'):
-    if jsfile.endswith("benchmarks.json"):
-        continue
+
+def strategy(record):
+    """runs of a model are only fitted together if they were mapped with
+    the same strategies and neuron size"""
+    return "placer {} merger routing {} n_size {}".format(
+        record.get("placer") or "default",
+        record.get("merger_routing") or "default",
+        record.get("n_size") or "default")
+
+
+for jsfile in glob.glob('*_results.json'):
     name, parameters = jsfile.split("_network_")
 
     # column is plotted in an extra plot
     if "column" in name: continue
 
+    record = results.load(jsfile)
+    # failed runs carry no statistics, they are only counted
+    if not results.succeeded(record):
+        failed[name] += 1
+        continue
+
     if name not in data:
         data[name] = defaultdict(list)
-    with open(jsfile, 'r') as f:
-        jsondata = json.load(f)
-        for jd in jsondata['results']:
-            if jd['name'] in (xkeys + ykeys_loss + ykeys_time):
-                data[name][jd['name']].append(float(jd['value']))
+    values = results.metrics(record)
+    for key in (xkeys + ykeys_loss + ykeys_time):
+        data[name][key].append(float(values[key]))
+    for key in ykeys_memory + ykeys_denmems:
+        data[name][key].append(float(values.get(key, np.nan)))
+    # marocco's default neuron size if not given
+    n_size = record.get("n_size")
+    data[name]['n_size'].append(np.nan if n_size is None else float(n_size))
+    data[name]['strategy'].append(strategy(record))
+
+for name, count in failed.items():
+    print("Skipped {} failed runs of {}".format(count, name))
 
 plotdata = {}
 for name in data.keys():
     plotdata[name] = {}
-    for key in (xkeys + ykeys_loss + ykeys_time):
+    for key in (xkeys + ykeys_loss + ykeys_time + ykeys_memory +
+                ykeys_denmems + ['n_size']):
         plotdata[name][key] = np.array(data[name][key])
+    plotdata[name]['strategy'] = np.array(data[name]['strategy'])
 
     for key in ykeys_loss:
         plotdata[name][key] /= plotdata[name]['synapses']
 
 
+fits = {}
 for name in plotdata:
     pd = plotdata[name]
 
@@ -101,6 +131,66 @@ for name in plotdata:
         ax.grid()
         plt.savefig(pdf, format='pdf')
         plt.close()
+
+        # trade-off between neuron size, capacity and mapping time
+        n_sizes = np.unique(pd['n_size'][~np.isnan(pd['n_size'])])
+        if len(n_sizes) > 1:
+            fig = plt.figure(figsize=(6, 9))
+            axes = [fig.add_subplot(3, 1, i + 1) for i in range(3)]
+            for n_size in n_sizes:
+                mask = pd['n_size'] == n_size
+                label = 'n_size {:g}'.format(n_size)
+                for ax, ykey in zip(axes, ['setup_time', 'synapse_loss',
+                                           'denmem_usage']):
+                    ax.plot(pd['synapses'][mask], pd[ykey][mask], 'x',
+                            label=label)
+            for ax, ylabel in zip(axes, ['time [s]',
+                                         'relative loss of synapses',
+                                         'denmems used of a wafer']):
+                ax.set_ylabel(ylabel)
+                ax.grid()
+            axes[0].legend()
+            axes[-1].set_xlabel('#synapses')
+            plt.savefig(pdf, format='pdf')
+            plt.close()
+
+        # power law fits of time and memory, a straight line in log-log,
+        # one fit per strategy
+        fits[name] = {}
+        for ylabel, ykeys in [('time [s]', ykeys_time),
+                              ('memory [MB]', ykeys_memory)]:
+            fig = plt.figure()
+            ax = fig.add_subplot(111)
+            ax.set_xlabel('#synapses')
+            ax.set_ylabel(ylabel)
+            ax.set_xscale('log')
+            ax.set_yscale('log')
+            for label in np.unique(pd['strategy']):
+                rows = pd['strategy'] == label
+                synapses = pd['synapses'][rows]
+                for ykey in ykeys:
+                    fit = scaling.fit_scaling(synapses, pd[ykey][rows])
+                    if fit is None:
+                        continue
+                    fits[name].setdefault(label, {})[ykey] = fit
+                    print(scaling.describe(
+                        "{} {} {}".format(name, label, ykey), fit))
+                    points = ax.plot(synapses, pd[ykey][rows], 'x')
+                    xfit = np.logspace(np.log10(np.min(synapses)),
+                                       np.log10(np.max(synapses)))
+                    ax.plot(xfit, scaling.power_law(
+                                xfit, (fit['prefactor'], fit['exponent'])),
+                            color=points[0].get_color(),
+                            label='{} {} ~ synapses^{:.2f}'.format(
+                                label, ykey, fit['exponent']))
+            ax.legend(fontsize=6)
+            ax.grid()
+            plt.savefig(pdf, format='pdf')
+            plt.close()
     print("Saved results in {}".format(pdfname))
 
+with open('scaling_fits.json', 'w') as outfile:
+    json.dump(fits, outfile, indent=2)
+print("Saved scaling fits in scaling_fits.json")
+
 plotColumnInOnePlot.main()
\ No newline at end of file
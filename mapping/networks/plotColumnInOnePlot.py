@@ -1,25 +1,28 @@
 import numpy as np
-import json
 import glob
+import json
+import multiprocessing as mp
+import os
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_pdf import PdfPages
-
-def plotTotalLoss(experiments):
-    sizes = []
-    losses = []
-    labels = []
-
-    # Put experiment information in the upper 3 lists
-    for exp in experiments:
-        losses.append(exp["lostSynsRel"])
-        sizes.append(exp["scale"])
-        if(exp["ignore_blacklisting"]):
-            labels.append("n_Size: " + str(exp["n_size"]) +
-                       " Model: " + exp["model"] + " placer: " + exp["placer"] + " ignore blackl.")
-        else:
-            labels.append("n_Size: " + str(exp["n_size"]) +
-                       " Model: " + exp["model"] + " placer: " + exp["placer"] + " wafer: " + str(exp["wafer"]))
-
+import results
+import scaling
+
+# parameters of a cortical column run and the metrics read from its results
+FIELDS = ["model", "placer", "n_size", "wafer", "ignore_blacklisting", "scale"]
+METRICS = ["synapses", "neurons", "synapse_loss", "synapse_loss_after_l1",
+           "total_time"]
+# runs with equal values of these are drawn as one line, the full-scale runs
+# with chunked projections are a model of their own
+GROUPING = ["model", "placer", "n_size", "wafer", "ignore_blacklisting"]
+
+def groupLabel(model, placer, n_size, wafer, ignore_blacklisting):
+    label = model + " N_Size: " + str(n_size) + " Placer: " + placer
+    if(ignore_blacklisting):
+        return label + " ignore blackl."
+    return label + " wafer: " + str(wafer)
+
+def plotTotalLoss(table):
     # This is only to make another axis showing the used synapses (porportional to the network_size^2)
     fig = plt.figure()
     ax1 = fig.add_subplot(111)
@@ -28,15 +31,13 @@ def plotTotalLoss(experiments):
     # For the diagramm ticks
     maxXVal = 0
 
-    for i in list(set(labels)):
+    lostSynsRel = table.synapse_loss / table.synapses
+    for key, rows in results.group_by(table, GROUPING):
 
-        mask = np.array(labels) == i
-        xVal = np.array(sizes)[mask]
-        yVal = np.array(losses)[mask]
+        xVal = table.scale[rows]
+        yVal = lostSynsRel[rows]
         sorting = np.argsort(xVal)
-        printLabelset = str(i).split(" ")
-        printLabel = "plot total loss of N_Size: " + \
-            printLabelset[1] + " Placer: " + printLabelset[5] + " " + printLabelset[6] + " " + printLabelset[7]
+        printLabel = "plot total loss of " + groupLabel(*key)
         print(printLabel)
 
         # plot percentage
@@ -59,7 +60,7 @@ def plotTotalLoss(experiments):
 
     # Calc the amount of synapses for each size
     scale = np.linspace(0, maxXVal*100, 6)
-    totalSyns = 300000000
+    totalSyns = scaling.FULL_SCALE_SYNAPSES
     synapseAmount = np.array((scale / 100.0)**2 *
                              totalSyns / 10000.0, dtype=int)
 
@@ -73,94 +74,135 @@ def plotTotalLoss(experiments):
     fig.savefig("cortical_column_all_losses.pdf")
     plt.figure()
 
-def plotLossPerConnection(experiments):
-    colors = ["orange", "blue", "green", "red", "violett"]
-    sortings = ["Source", "Target"]
+def plotScaling(table):
+    # fit the total time against the number of synapses for each placer
+    groups = dict((groupLabel(*key), rows)
+                  for key, rows in results.group_by(table, GROUPING))
+
+    fits = {}
+    fig = plt.figure()
+    ax = fig.add_subplot(111)
+    for label in sorted(groups):
+        xVal = table.synapses[groups[label]]
+        yVal = table.total_time[groups[label]]
+        fit = scaling.fit_scaling(xVal, yVal)
+        if fit is None:
+            continue
+        fits[label] = fit
+        print(scaling.describe(label, fit) + ", full scale: {:.3g} s".format(
+            fit["extrapolation"]["{:g}".format(scaling.FULL_SCALE_SYNAPSES)]))
+
+        points = ax.plot(xVal, yVal, 'x')
+        # show the fit up to the full-scale column
+        xFit = np.logspace(np.log10(np.min(xVal)),
+                           np.log10(scaling.FULL_SCALE_SYNAPSES))
+        ax.plot(xFit, scaling.power_law(xFit, (fit["prefactor"], fit["exponent"])),
+                color=points[0].get_color(), linewidth=0.5,
+                label=label + " ~ synapses^{:.2f}".format(fit["exponent"]))
+
+    ax.axvline(scaling.FULL_SCALE_SYNAPSES, color="grey", linestyle="--")
+    ax.set_xscale("log")
+    ax.set_yscale("log")
+    ax.set_xlabel("Amount of total Synapses")
+    ax.set_ylabel("Total Time in s")
+    ax.legend(fontsize=6)
+    ax.grid()
+    fig.savefig("cortical_column_scaling.pdf")
+    plt.close(fig)
+
+    with open("scaling_fits_cortical_column.json", "w") as outfile:
+        json.dump(fits, outfile, indent=2)
+
+# directory of the per-experiment pdfs of plotLossPerConnection
+LOSS_PER_CONNECTION_DIR = "cortical_column_population_wise_losses"
+SORTINGS = ["Source", "Target"]
+
+# figure reused for all pages rendered by a worker process
+_lossFigure = None
+
+def experimentTitle(experiment):
+    return "Placer: "+ experiment["placer"] + " Scale: "+ str(100 * experiment["scale"]) +"% Neuron Size: "+ str(
+        experiment["n_size"]) + (" without blacklisting " if experiment["ignore_blacklisting"] else " Wafer: " + str(
+            experiment['wafer']))
+
+def plotExperimentLoss(args):
+    """renders the realized and lost synapses of all projections of one
+    experiment, one page per sorting, into the given pdf"""
+    global _lossFigure
+    experiment, pdfname = args
+    if _lossFigure is None:
+        _lossFigure = plt.figure(figsize=(9, 6))
+
+    # collect all data
+    labels = np.array(list(experiment["perPopulation"].keys()))
+    loss = np.array([value["synLoss"] for value in experiment["perPopulation"].values()])
+    total = np.array([value["TotalSyns"] for value in experiment["perPopulation"].values()])
+    realized = total - loss
+    sortMasks = {
+        "Source": np.argsort(labels),
+        # projections are labelled source-target
+        "Target": np.argsort(np.array(["".join(label.split("-")[::-1]) for label in labels])),
+    }
+
+    print("plotting   " + "Placer: "+ experiment["placer"] + " Scale: "+ str(100 * experiment["scale"]) +"% Neuron Size: "+ str(
+        experiment["n_size"]) )
 
-    pdfname = 'cortical_column_population_wise_losses.pdf'
     with PdfPages(pdfname) as pdf:
-        for sorting in sortings:
-            for experiment in experiments:
-
-                plt.figure(figsize=(9, 6))
-
-                # collect all data
-                loss = []
-                total = []
-                labels = []
-                for key, value in experiment["perPopulation"].items():
-                    loss.append(value["synLoss"])
-                    total.append(value["TotalSyns"])
-                    labels.append(key)
-                loss, total, labels = np.array(
-                    loss), np.array(total), np.array(labels)
-                realized = total - loss
-                if sorting == "Source":
-                    sortMask = np.argsort(labels)
-
-                if sorting == "Target":
-                    sort = []
-                    for label in labels:
-                        sort.append(label.split("-")[1] + label.split("-")[0])
-                    sortMask = np.argsort(np.array(sort))
-
-                print("plotting   " + "Placer: "+ experiment["placer"] + " Scale: "+ str(100 * experiment["scale"]) +"% Neuron Size: "+ str(
-                    experiment["n_size"]) )
-
-                plt.bar(np.arange(total[sortMask].shape[0]), total[sortMask], tick_label=labels[sortMask], alpha=0.8, label="Lost Synapses")
-                plt.bar(np.arange(total[sortMask].shape[0]), realized[sortMask], tick_label=labels[sortMask],  alpha=0.8, label="Realized Synapses")
-
-                plt.ticklabel_format(style='sci', axis='y', scilimits=(0, 0))
-                plt.xticks(fontsize=8, rotation=90)
-                plt.legend()
-                plt.ylabel("Amount of Synapses")
-
-                title = "Placer: "+ experiment["placer"] + " Scale: "+ str(100 * experiment["scale"]) +"% Neuron Size: "+ str(
-                        experiment["n_size"]) + (" without blacklisting " if experiment["ignore_blacklisting"] else " Wafer: " + str(
-                            experiment['wafer'])) + " \n Realized and Lost Synapses ordered by the " + sorting + " Population"
-
-                plt.title(title, pad = 20, fontdict = {"fontsize": 14})
-
-                plt.savefig(pdf, format='pdf')
-                plt.close()
+        for sorting in SORTINGS:
+            sortMask = sortMasks[sorting]
+            _lossFigure.clf()
+            ax = _lossFigure.add_subplot(111)
+
+            ax.bar(np.arange(total[sortMask].shape[0]), total[sortMask], tick_label=labels[sortMask], alpha=0.8, label="Lost Synapses")
+            ax.bar(np.arange(total[sortMask].shape[0]), realized[sortMask], tick_label=labels[sortMask],  alpha=0.8, label="Realized Synapses")
+
+            ax.ticklabel_format(style='sci', axis='y', scilimits=(0, 0))
+            ax.tick_params(axis='x', labelsize=8, labelrotation=90)
+            ax.legend()
+            ax.set_ylabel("Amount of Synapses")
+
+            title = experimentTitle(experiment) + " \n Realized and Lost Synapses ordered by the " + sorting + " Population"
+
+            ax.set_title(title, pad = 20, fontdict = {"fontsize": 14})
+
+            _lossFigure.savefig(pdf, format='pdf')
+    return pdfname
+
+def plotLossPerConnection(experiments, processes=None):
+    """Renders one pdf per experiment in a process pool and writes an
+    index.html linking all of them."""
+    if not os.path.isdir(LOSS_PER_CONNECTION_DIR):
+        os.makedirs(LOSS_PER_CONNECTION_DIR)
+    experiments = [experiment for experiment in experiments if "perPopulation" in experiment]
+    jobs = [(experiment, os.path.join(LOSS_PER_CONNECTION_DIR, experiment["task"] + ".pdf"))
+            for experiment in experiments]
+
+    pool = mp.Pool(processes=processes)
+    pdfnames = pool.map(plotExperimentLoss, jobs)
+    pool.close()
+    pool.join()
+
+    with open(os.path.join(LOSS_PER_CONNECTION_DIR, "index.html"), "w") as index:
+        index.write("<html><body><h1>Realized and Lost Synapses per Projection</h1><ul>\n")
+        for experiment, pdfname in zip(experiments, pdfnames):
+            index.write('<li><a href="{}">{}</a></li>\n'.format(
+                os.path.basename(pdfname), experimentTitle(experiment)))
+        index.write("</ul></body></html>\n")
+    print("Saved population wise losses in {}".format(LOSS_PER_CONNECTION_DIR))
 
 def main():
 
     #Load all Cortical Column Results
-    files = glob.glob("cortical_column*.json")
-
-    data = []
-    for afile in files:
-        with open(afile) as json_file:
-            data.append(json.load(json_file))
-
-    experiments = []
-    for exper in data:
-
-        thisRun = {}
-
-        # read out
-        thisRun["scale"] = exper["scale"]
-        thisRun["model"] = exper["model"]
-        thisRun["placer"] = exper["placer"]
-        thisRun["n_size"] = exper["n_size"]
-        thisRun["wafer"] = exper["wafer"]
-        thisRun["ignore_blacklisting"] = exper["ignore_blacklisting"]
-        thisRun["totSyns"] = exper["results"][2]["value"]
-        thisRun["totNeurons"] = exper["results"][3]["value"]
-        thisRun["lostSyns"] = exper["results"][4]["value"]
-        thisRun["lostSynsl1"] = exper["results"][5]["value"]
-
-        thisRun["lostSynsl1Rel"] = thisRun["lostSynsl1"] / \
-            float(thisRun["totSyns"])
-        thisRun["lostSynsRel"] = thisRun["lostSyns"] / float(thisRun["totSyns"])
-
-        if("perPopulation" in exper):
-            thisRun["perPopulation"] = exper["perPopulation"]
-        experiments.append(thisRun)
-
-    # Sorting
-    experiments = sorted(experiments, key=lambda elem: "%s %s %s %s %s" % (elem['placer'], elem['wafer'],elem['n_size'],
-        elem['scale'],elem['ignore_blacklisting']))
-    plotTotalLoss(experiments)
+    files = glob.glob("cortical_column*_results.json")
+    table, records = results.load_table(files, FIELDS, METRICS)
+    print("skipped {} failed runs".format(len(files) - len(records)))
+
+    # Sorting by placer, wafer, n_size, scale and blacklisting
+    order = np.lexsort((table.ignore_blacklisting, table.scale, table.n_size,
+                        table.wafer, table.placer))
+    table = table[order]
+    experiments = [records[i] for i in order]
+
+    plotTotalLoss(table)
+    plotScaling(table)
     plotLossPerConnection(experiments)
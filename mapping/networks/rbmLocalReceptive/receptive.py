@@ -0,0 +1,35 @@
+"""Local receptive fields as index arrays."""
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+
+def hidden_shape(height, width, field_height, field_width, stride=1):
+    """edge sizes of the hidden layer, one neuron per field position"""
+    return ((height - field_height) // stride + 1,
+            (width - field_width) // stride + 1)
+
+
+def receptive_fields(height, width, field_height, field_width, stride=1):
+    """
+        Connections between a visible layer of height x width neurons and
+        a hidden layer whose neurons each see a field of field_height x
+        field_width visible neurons. The fields are shifted by stride
+        along both axes. All neurons are numbered in row-major order.
+
+        The fields are a strided view of the visible indices, so that no
+        python loop runs over neurons or fields. Returns the index arrays of
+        the visible and the hidden neuron of each connection.
+    """
+    visible = np.arange(height * width).reshape(height, width)
+    rows, columns = hidden_shape(height, width, field_height, field_width,
+                                 stride)
+    row_stride, column_stride = visible.strides
+    fields = as_strided(visible,
+                        shape=(rows, columns, field_height, field_width),
+                        strides=(stride * row_stride, stride * column_stride,
+                                 row_stride, column_stride),
+                        writeable=False)
+    field_size = field_height * field_width
+    return (fields.reshape(rows * columns * field_size),
+            np.repeat(np.arange(rows * columns), field_size))
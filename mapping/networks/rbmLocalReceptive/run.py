@@ -1,8 +1,7 @@
 #!/usr/bin/env python
 
 import argparse
-from datetime import datetime
-import json
+import os
 import sys
 
 import pyhmf as pynn
@@ -13,17 +12,57 @@ import pyhalco_hicann_v2 as C
 from pysthal.command_line_util import init_logger
 init_logger("WARN", [])
 
+import receptive
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+import artifacts
+import capacity
+import results
+import strategies
+
+# version 2 builds each layer as a single population instead of one
+# population per neuron, the mapping of the versions is not comparable
+VERSION = 2
+
 
 class rbmLocalReceptiveFieldsNetwork(object):
-    def __init__(self, N, K, L, marocco, model=pynn.EIF_cond_exp_isfa_ista):
+    def __init__(self, N, K, L, marocco, model=pynn.EIF_cond_exp_isfa_ista,
+                 Nwidth=None, Kwidth=None, stride=1):
+        """
+            Keywords:
+                --- N, Nwidth: edge sizes of the visible layer
+                --- K, Kwidth: edge sizes of the receptive fields
+                --- L: number of label neurons
+                --- stride: shift between neighbouring receptive fields
+            The widths default to the heights, i.e. square layers.
+        """
         self.N = N
+        self.Nwidth = Nwidth or N
         self.K = K
+        self.Kwidth = Kwidth or K
         self.L = L
+        self.stride = stride
         self.model = model
         self.marocco = marocco
 
         pynn.setup(marocco=self.marocco)
 
+    def connectivity(self):
+        """population sizes and connections as built, see capacity.py"""
+        visible, hidden = receptive.receptive_fields(
+            self.N, self.Nwidth, self.K, self.Kwidth, self.stride)
+        rows, columns = receptive.hidden_shape(
+            self.N, self.Nwidth, self.K, self.Kwidth, self.stride)
+        Nhidden = rows * columns
+        # populations label, visible and hidden, an excitatory and an
+        # inhibitory projection in each direction
+        return ([self.L, self.N * self.Nwidth, Nhidden],
+                [(1, 2, visible, hidden)] * 2 +
+                [(2, 1, hidden, visible)] * 2 +
+                [(2, 0) + capacity.all_to_all(Nhidden, self.L)] * 2 +
+                [(0, 2) + capacity.all_to_all(self.L, Nhidden)] * 2)
+
     def build(self):
 
         #####
@@ -35,21 +74,13 @@ class rbmLocalReceptiveFieldsNetwork(object):
         labelPop = pynn.Population(self.L, self.model)
 
         # visible
-        visiblePop = []
-        for outer in range(self.N):
-            neurons = []
-            for inner in range(self.N):
-                neurons.append(pynn.Population(1, self.model))
-            visiblePop.append(neurons)
+        visiblePop = pynn.Population(self.N * self.Nwidth, self.model)
 
-        # visible
-        Nhidden = self.N - self.K + 1
-        hiddenPop = []
-        for outer in range(Nhidden):
-            neurons = []
-            for inner in range(Nhidden):
-                neurons.append(pynn.Population(1, self.model))
-            hiddenPop.append(neurons)
+        # hidden
+        rows, columns = receptive.hidden_shape(
+            self.N, self.Nwidth, self.K, self.Kwidth, self.stride)
+        Nhidden = rows * columns
+        hiddenPop = pynn.Population(Nhidden, self.model)
         ####
 
         ####
@@ -58,50 +89,36 @@ class rbmLocalReceptiveFieldsNetwork(object):
         # between hidden and visible
         # each neuron in the hidden layer sees
         # only a local field in the visible layer
-        for outerI in range(Nhidden):
-            for outerJ in range(Nhidden):
-                for innerI in range(self.K):
-                    for innerJ in range(self.K):
-                        i = outerI + innerI
-                        j = outerJ + innerJ
-                        pynn.Projection(visiblePop[i][j],
-                                        hiddenPop[outerI][outerJ],
-                                        connector,
-                                        target='excitatory')
-                        pynn.Projection(visiblePop[i][j],
-                                        hiddenPop[outerI][outerJ],
-                                        connector,
-                                        target='inhibitory')
-                        pynn.Projection(hiddenPop[outerI][outerJ],
-                                        visiblePop[i][j],
-                                        connector,
-                                        target='excitatory')
-                        pynn.Projection(hiddenPop[outerI][outerJ],
-                                        visiblePop[i][j],
-                                        connector,
-                                        target='inhibitory')
+        visible, hidden = receptive.receptive_fields(
+            self.N, self.Nwidth, self.K, self.Kwidth, self.stride)
+        weights = [0.003] * len(visible)
+        delays = [0.] * len(visible)
+        toHidden = pynn.FromListConnector(
+            list(zip(visible.tolist(), hidden.tolist(), weights, delays)))
+        toVisible = pynn.FromListConnector(
+            list(zip(hidden.tolist(), visible.tolist(), weights, delays)))
+        for target in ['excitatory', 'inhibitory']:
+            pynn.Projection(visiblePop,
+                            hiddenPop,
+                            toHidden,
+                            target=target)
+            pynn.Projection(hiddenPop,
+                            visiblePop,
+                            toVisible,
+                            target=target)
 
         # between hidden and label
         # there is full connectivity between
         # the hidden layer and the label layer
-        for outer in range(Nhidden):
-            for inner in range(Nhidden):
-                pynn.Projection(hiddenPop[outer][inner],
-                                labelPop,
-                                connector,
-                                target='inhibitory')
-                pynn.Projection(hiddenPop[outer][inner],
-                                labelPop,
-                                connector,
-                                target='excitatory')
-                pynn.Projection(labelPop,
-                                hiddenPop[outer][inner],
-                                connector,
-                                target='inhibitory')
-                pynn.Projection(labelPop,
-                                hiddenPop[outer][inner],
-                                connector,
-                                target='excitatory')
+        for target in ['inhibitory', 'excitatory']:
+            pynn.Projection(hiddenPop,
+                            labelPop,
+                            connector,
+                            target=target)
+            pynn.Projection(labelPop,
+                            hiddenPop,
+                            connector,
+                            target=target)
 
     def run(self):
         pynn.run(1)
@@ -114,29 +131,51 @@ def main():
                         help='Edge size of the visible layer. \
                         The number of neurons in the visible\
                         layer is hence NxN')
+    parser.add_argument('--Nwidth', type=int,
+                        help='Width of the visible layer if it is not '
+                             'square.')
     parser.add_argument('--K', default=8, type=int,
                         help='Edge size of the local receptive fields.\
                         K has to be larger than N.')
+    parser.add_argument('--Kwidth', type=int,
+                        help='Width of the receptive fields if they are '
+                             'not square.')
+    parser.add_argument('--stride', default=1, type=int,
+                        help='Shift between neighbouring receptive fields.')
     parser.add_argument('--L', default=10, type=int,
                         help='Number of neurons in the label layer.')
     parser.add_argument('--name', default="fullyVisibleBm_network", type=str)
     parser.add_argument('--defects_path', type=str)
     parser.add_argument('--wafer', '-w', type=int, default=24)
+    parser.add_argument('--seed', default=42, type=int,
+                        help='stored in the result only, the connectivity of '
+                             'this model is deterministic')
+    strategies.add_arguments(parser)
+    artifacts.add_arguments(parser)
+    capacity.add_arguments(parser)
+    results.add_arguments(parser)
 
     args = parser.parse_args()
 
     # The edge size of the visible layer has to be larger or equal
     # than the edge size of the receptive fields
-    if args.N < args.K:
-        sys.exit('The edge size of the visible layer {0}'
-                 ' has to be larger than the edge size {1}'
+    args.Nwidth = args.Nwidth or args.N
+    args.Kwidth = args.Kwidth or args.K
+    if args.N < args.K or args.Nwidth < args.Kwidth:
+        sys.exit('The edge size of the visible layer {0}x{1}'
+                 ' has to be larger than the edge size {2}x{3}'
                  ' of the local receptive '
-                 ' fields!'.format(args.N, args.K))
+                 ' fields!'.format(args.N, args.Nwidth, args.K, args.Kwidth))
 
     taskname = "N{}_K{}_L{}_wafer{}".format(args.N,
                                     args.K,
                                     args.L,
                                     args.wafer)
+    if args.Nwidth != args.N or args.Kwidth != args.K:
+        taskname += "_Nwidth{}_Kwidth{}".format(args.Nwidth, args.Kwidth)
+    if args.stride != 1:
+        taskname += "_stride{}".format(args.stride)
+    taskname += "_v{}".format(VERSION)
 
     marocco = pymarocco.PyMarocco()
     marocco.continue_despite_synapse_loss = True
@@ -151,66 +190,40 @@ def main():
         marocco.defects.path = "/wang/data/commissioning/BSS-1/rackplace/" + str(
             args.wafer) + "/derived_plus_calib_blacklisting/current"
 
-    marocco.persist = "results_{}_{}.xml.gz".format(args.name, taskname)
-
-    start = datetime.now()
-    r = rbmLocalReceptiveFieldsNetwork(args.N, args.K, args.L, marocco)
-    r.build()
-    mid = datetime.now()
+    taskname += strategies.configure(marocco, args.placer, args.merger_routing,
+                                     args.n_size)
+    marocco.persist = artifacts.filename(args.name, taskname,
+                                         args.persist_format)
+
+    result = results.Result(args.name, taskname, marocco=marocco,
+                            profile=args.profile,
+                            seed=args.seed, wafer=args.wafer,
+                            placer=args.placer,
+                            merger_routing=args.merger_routing,
+                            n_size=args.n_size,
+                            Nwidth=args.Nwidth, Kwidth=args.Kwidth,
+                            stride=args.stride,
+                            model_version=VERSION)
     try:
+        result.enter("build")
+        r = rbmLocalReceptiveFieldsNetwork(args.N, args.K, args.L, marocco,
+                                           Nwidth=args.Nwidth,
+                                           Kwidth=args.Kwidth,
+                                           stride=args.stride)
+        if capacity.analyse(result, r, args, marocco):
+            return
+        r.build()
+        result.enter("mapping")
         r.run()
-        totsynapses = marocco.stats.getSynapses()
-        totneurons = marocco.stats.getNumNeurons()
-        lostsynapses = marocco.stats.getSynapseLoss()
-        lostsynapsesl1 = marocco.stats.getSynapseLossAfterL1Routing()
-    except RuntimeError:
+        result.collect_statistics(marocco)
+    except RuntimeError as err:
         # couldn't place all populations
-        totsynapses = 1
-        totneurons = 1
-        lostsynapses = 1
-        lostsynapsesl1 = 1
-
-    end = datetime.now()
-
-    result = {
-        "model": args.name,
-        "task": taskname,
-        "timestamp": datetime.now().isoformat(),
-        "results": [
-            {"type": "performance",
-             "name": "setup_time",
-             "value": (end - mid).total_seconds(),
-             "units": "s",
-             "measure": "time"
-             },
-            {"type": "performance",
-             "name": "total_time",
-             "value": (end - start).total_seconds(),
-             "units": "s",
-             "measure": "time"
-             },
-            {"type": "performance",
-             "name": "synapses",
-             "value": totsynapses
-             },
-            {"type": "performance",
-             "name": "neurons",
-             "value": totneurons
-             },
-            {"type": "performance",
-             "name": "synapse_loss",
-             "value": lostsynapses
-             },
-            {"type": "performance",
-             "name": "synapse_loss_after_l1",
-             "value": lostsynapsesl1
-             }
-        ]
-    }
-
-    with open("{}_{}_results.json".format(result["model"], result["task"]),
-              'w') as outfile:
-        json.dump(result, outfile)
+        result.fail(err)
+    result.finish()
+    result.write()
+
+    if result.failed:
+        sys.exit(results.EXIT_FAILED)
 
 
 if __name__ == '__main__':
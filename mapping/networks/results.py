@@ -0,0 +1,313 @@
+"""Result records of the mapping benchmarks.
+
+Every run.py writes one json record per mapping run. Besides the performance
+metrics the record states whether the run succeeded and, if not, the phase
+in which it failed and the exception, so that failed runs are never mixed
+with real data.
+"""
+
+import cProfile
+from datetime import datetime
+import json
+import os
+import resource
+import sys
+import traceback
+
+import numpy as np
+
+import artifacts
+import environment
+import events
+import persisted
+
+# exit code of a run.py whose mapping failed after writing its result record,
+# any other non-zero code means the script crashed without a record
+EXIT_FAILED = 3
+
+# metrics which are only meaningful for a successful mapping
+STATISTICS = ['synapses', 'neurons', 'synapse_loss', 'synapse_loss_after_l1']
+
+# denmems of a wafer, 384 HICANNs with 512 denmems each
+DENMEMS_PER_WAFER = 384 * 512
+
+
+def add_arguments(parser):
+    parser.add_argument('--profile', action='store_true',
+                        help='store cProfile statistics of each phase '
+                             'next to the result')
+
+
+class Result(object):
+    def __init__(self, model, task, marocco=None, profile=False,
+                 **metadata):
+        """
+            Record of a single mapping run.
+
+            Keywords:
+                --- model: name of the benchmark model
+                --- task: name of the grid point
+                --- marocco: configured PyMarocco, its defects and
+                             calibration are part of the environment
+                --- profile: store cProfile statistics of every phase as
+                             {model}_{task}_{phase}.prof
+                --- metadata: additional entries stored in the record
+        """
+        self.model = model
+        self.task = task
+        self.profile = profile
+        self.profiler = None
+        self.profiles = {}
+        self.metadata = metadata
+        self.status = "running"
+        self.phase = None
+        self.error = None
+        self.results = []
+        self.phase_starts = {}
+        # the command line identifies the job of the sweep, see spec.py
+        self.arguments = sys.argv[1:]
+        # the persisted mapping result is moved to the artifact store
+        self.persist = None
+        # hashing the defects and calibration is not part of the timings
+        if marocco is None:
+            self.environment = environment.collect()
+        else:
+            self.persist = marocco.persist
+            self.environment = environment.collect(
+                defects_path=marocco.defects.path,
+                calib_path=marocco.calib_path)
+        self.start = datetime.now()
+
+    @property
+    def failed(self):
+        return self.status == "failed"
+
+    def enter(self, phase):
+        """marks the begin of the phase (build, mapping, statistics), models
+        generating their connectivity up front add a generate phase"""
+        self._stop_profiler()
+        self.phase = phase
+        self.phase_starts[phase] = datetime.now()
+        events.emit("phase", model=self.model, task=self.task, phase=phase)
+        if self.profile:
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def _stop_profiler(self):
+        if self.profiler is None:
+            return
+        self.profiler.disable()
+        filename = "{}_{}_{}.prof".format(self.model, self.task, self.phase)
+        self.profiler.dump_stats(filename)
+        self.profiles[self.phase] = filename
+        self.profiler = None
+
+    def add(self, name, value, units=None, measure=None):
+        entry = {"type": "performance",
+                 "name": name,
+                 "value": value}
+        if units is not None:
+            entry["units"] = units
+        if measure is not None:
+            entry["measure"] = measure
+        self.results.append(entry)
+
+    def value(self, name):
+        for entry in self.results:
+            if entry["name"] == name:
+                return entry["value"]
+        return None
+
+    def collect_statistics(self, marocco):
+        """reads the statistics from marocco after the mapping has run,
+        statistics read before an error are kept in the record"""
+        self.enter("statistics")
+        self.add("synapses", marocco.stats.getSynapses())
+        self.add("neurons", marocco.stats.getNumNeurons())
+        self.add("synapse_loss", marocco.stats.getSynapseLoss())
+        self.add("synapse_loss_after_l1",
+                 marocco.stats.getSynapseLossAfterL1Routing())
+        # every neuron is placed on neuron size many denmems
+        denmems = marocco.stats.getNumNeurons() * \
+            marocco.neuron_placement.default_neuron_size()
+        self.add("denmems", denmems)
+        self.add("denmem_usage", denmems / float(DENMEMS_PER_WAFER))
+
+    def fail(self, err):
+        self.status = "failed"
+        self.error = {"type": type(err).__name__,
+                      "message": str(err),
+                      "traceback": traceback.format_exc()}
+        events.emit("failed", model=self.model, task=self.task,
+                    phase=self.phase, error=self.error)
+
+    def finish(self):
+        """stops the clock, timings are measured up to the failure"""
+        end = datetime.now()
+        self._stop_profiler()
+        if not self.failed:
+            self.status = "success"
+            self.phase = "done"
+        timings = []
+        if "mapping" in self.phase_starts:
+            timings.append({"type": "performance",
+                            "name": "setup_time",
+                            "value": (end - self.phase_starts["mapping"]
+                                      ).total_seconds(),
+                            "units": "s",
+                            "measure": "time"})
+        timings.append({"type": "performance",
+                        "name": "total_time",
+                        "value": (end - self.start).total_seconds(),
+                        "units": "s",
+                        "measure": "time"})
+        # duration of each phase, a phase lasts until the next one begins
+        starts = sorted(self.phase_starts.items(), key=lambda item: item[1])
+        ends = [start for _, start in starts[1:]] + [end]
+        for (phase, start), phase_end in zip(starts, ends):
+            timings.append({"type": "performance",
+                            "name": phase + "_time",
+                            "value": (phase_end - start).total_seconds(),
+                            "units": "s",
+                            "measure": "time"})
+        self.results = timings + self.results
+        # peak resident memory of the process in MB (ru_maxrss is in kB)
+        self.add("max_memory",
+                 resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.,
+                 units="MB", measure="memory")
+        # counted after the clock has stopped, so that reading the persisted
+        # result adds to neither the timings nor the peak memory
+        if not self.failed and self.persist:
+            try:
+                self.add("mergers", persisted.mergers(self.persist))
+            except Exception as err:
+                # e.g. binary archives, which only marocco reads, or archives
+                # without the expected tags, the metric is missing then
+                sys.stderr.write("mergers not counted: {}\n".format(err))
+
+    def to_dict(self):
+        record = {
+            "model": self.model,
+            "task": self.task,
+            "timestamp": datetime.now().isoformat(),
+            "status": self.status,
+            "phase": self.phase,
+        }
+        record.update(self.metadata)
+        record["arguments"] = self.arguments
+        record["environment"] = self.environment
+        if self.error is not None:
+            record["error"] = self.error
+        if self.profiles:
+            record["profiles"] = self.profiles
+        record["results"] = self.results
+        return record
+
+    def write(self):
+        """writes the record, if parse.py passed an artifact store the
+        persisted mapping result is moved there, parse.py indexes it after
+        the sweep, see artifacts.py"""
+        record = self.to_dict()
+        store = os.environ.get(artifacts.STORE)
+        if store and self.persist and os.path.exists(self.persist):
+            record["artifact"] = artifacts.move(store, self.persist)
+        return write(record)
+
+
+def write(record):
+    filename = "{}_{}_results.json".format(record["model"], record["task"])
+    with open(filename, 'w') as outfile:
+        json.dump(record, outfile)
+    return filename
+
+
+def metrics(record):
+    """returns the results of a record as dict name -> value"""
+    return dict((entry["name"], entry["value"])
+                for entry in record["results"])
+
+
+def load(filename):
+    """Loads a result record.
+
+    Records written before the status was introduced stored the value 1 for
+    every statistic if the mapping failed, they are marked as failed here."""
+    with open(filename, 'r') as f:
+        record = json.load(f)
+    if "status" not in record:
+        values = metrics(record)
+        if all(values.get(name) == 1 for name in STATISTICS):
+            record["status"] = "failed"
+        else:
+            record["status"] = "success"
+            record["phase"] = "done"
+    return record
+
+
+def succeeded(record):
+    return record.get("status", "success") == "success"
+
+
+def aggregate(records):
+    """Combines the records of repeated runs of the same grid point.
+
+    The value of every metric becomes the median over the repetitions, the
+    spread is stored as interquartile range and minimum next to the samples.
+    Seeds of the repetitions are kept if they were stored."""
+    record = dict(records[-1])
+    values = [metrics(r) for r in records]
+    record["results"] = []
+    for entry in records[-1]["results"]:
+        # metrics like the mergers may be missing from single repetitions
+        samples = [v[entry["name"]] for v in values if entry["name"] in v]
+        q1, median, q3 = np.percentile(samples, [25, 50, 75])
+        entry = dict(entry)
+        entry.update({"value": float(median),
+                      "median": float(median),
+                      "iqr": float(q3 - q1),
+                      "min": min(samples),
+                      "samples": samples})
+        record["results"].append(entry)
+    record["repetitions"] = len(records)
+    if "seed" in record:
+        record["seeds"] = [r["seed"] for r in records]
+    return record
+
+
+def load_table(filenames, fields, metric_names):
+    """Loads the successful records into a numpy record array with one row
+    per record, which is sorted and grouped without python loops.
+
+    Keywords:
+        --- fields: entries of the records stored as columns
+        --- metric_names: metrics stored as float columns, looked up by name
+                          and nan if a record does not contain the metric
+    Returns the table and the list of the loaded records in the same order,
+    failed records are skipped."""
+    records = []
+    for filename in filenames:
+        record = load(filename)
+        if succeeded(record):
+            records.append(record)
+    values = [metrics(record) for record in records]
+    columns = [np.array([record[field] for record in records])
+               for field in fields]
+    columns += [np.array([v.get(name, np.nan) for v in values], dtype=float)
+                for name in metric_names]
+    table = np.rec.fromarrays(columns, names=list(fields) + list(metric_names))
+    return table, records
+
+
+def group_by(table, keys):
+    """Groups the rows of the table by the values of the key columns with a
+    single sort. Returns a list of (key values, row indices)."""
+    if len(table) == 0:
+        return []
+    keyarray = np.rec.fromarrays([table[key] for key in keys], names=keys)
+    _, first, inverse = np.unique(keyarray, return_index=True,
+                                  return_inverse=True)
+    inverse = inverse.ravel()
+    order = np.argsort(inverse, kind="mergesort")
+    boundaries = np.cumsum(np.bincount(inverse))[:-1]
+    return [(keyarray[index].tolist(), rows)
+            for index, rows in zip(first, np.split(order, boundaries))]
@@ -0,0 +1,121 @@
+"""Scaling laws of the mapping benchmarks.
+
+Time and memory of the mapping are fitted as power laws a * x**b of the
+network size x, usually the number of synapses. The exponent b tells how a
+model or placer scales, the fits are used to extrapolate to sizes which are
+too large to be run regularly.
+"""
+
+import numpy as np
+
+# number of synapses of the full-scale cortical column
+FULL_SCALE_SYNAPSES = 300000000
+
+# sizes in synapses the fits are extrapolated to
+TARGET_SYNAPSES = [1e6, 1e7, 1e8, FULL_SCALE_SYNAPSES]
+
+# a piecewise fit, with the breakpoint and two parameters per piece, is only
+# used if it lowers the Akaike information criterion of the single power law
+# by more than this margin
+AIC_MARGIN = 2.0
+
+
+def fit_power_law(x, y):
+    """Fits y = a * x**b by least squares in log-log space.
+    Returns (a, b) or None if there are less than two positive points."""
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    mask = (x > 0) & (y > 0)
+    if len(np.unique(x[mask])) < 2:
+        return None
+    b, log_a = np.polyfit(np.log(x[mask]), np.log(y[mask]), 1)
+    return float(np.exp(log_a)), float(b)
+
+
+def _residual(x, y, fit):
+    return np.sum((np.log(y) - np.log(power_law(x, fit)))**2)
+
+
+def _aic(residual, points, parameters):
+    """Akaike information criterion of a least squares fit"""
+    # a perfect fit would be infinitely likely
+    return points * np.log(max(residual, 1e-12) / points) + 2 * parameters
+
+
+def fit_piecewise_power_law(x, y, min_points=3):
+    """Fits two power laws below and above a breakpoint, which is chosen
+    among the measured sizes such that the squared residuals in log-log
+    space are minimal. Each piece needs at least min_points sizes.
+    Returns (breakpoint, lower fit, upper fit) or None."""
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    mask = (x > 0) & (y > 0)
+    x, y = x[mask], y[mask]
+    sizes = np.unique(x)
+    best = None
+    for breakpoint in sizes[min_points - 1:len(sizes) - min_points + 1]:
+        lower, upper = x <= breakpoint, x >= breakpoint
+        fits = fit_power_law(x[lower], y[lower]), \
+            fit_power_law(x[upper], y[upper])
+        if None in fits:
+            continue
+        residual = _residual(x[lower], y[lower], fits[0]) + \
+            _residual(x[upper], y[upper], fits[1])
+        if best is None or residual < best[0]:
+            best = (residual, float(breakpoint)) + fits
+    if best is None:
+        return None
+    return best[1:]
+
+
+def power_law(x, fit):
+    a, b = fit
+    return a * np.asarray(x, dtype=float)**b
+
+
+def fit_scaling(x, y, targets=TARGET_SYNAPSES):
+    """Fits a single and a piecewise power law and extrapolates to the
+    target sizes. If the piecewise fit describes the data significantly
+    better, see AIC_MARGIN, the extrapolation uses its upper piece, as it
+    describes the behaviour at large sizes. The points are those of the fit
+    used for the extrapolation. Returns a json serialisable dict or None if
+    nothing could be fitted."""
+    fit = fit_power_law(x, y)
+    if fit is None:
+        return None
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    mask = (x > 0) & (y > 0)
+    x, y = x[mask], y[mask]
+    scaling = {"prefactor": fit[0],
+               "exponent": fit[1],
+               "points": int(len(x))}
+    asymptotic = fit
+    piecewise = fit_piecewise_power_law(x, y)
+    if piecewise is not None:
+        breakpoint, lower, upper = piecewise
+        below, above = x <= breakpoint, x >= breakpoint
+        residual = _residual(x[below], y[below], lower) + \
+            _residual(x[above], y[above], upper)
+        if _aic(residual, len(x), 5) < \
+                _aic(_residual(x, y, fit), len(x), 2) - AIC_MARGIN:
+            scaling["piecewise"] = {
+                "breakpoint": breakpoint,
+                "lower": {"prefactor": lower[0], "exponent": lower[1],
+                          "points": int(below.sum())},
+                "upper": {"prefactor": upper[0], "exponent": upper[1],
+                          "points": int(above.sum())}}
+            scaling["points"] = int(above.sum())
+            asymptotic = upper
+    scaling["extrapolation"] = dict(
+        ("{:g}".format(target), float(power_law(target, asymptotic)))
+        for target in targets)
+    return scaling
+
+
+def describe(name, scaling):
+    """returns a line summarising the fit for printing"""
+    line = "{}: exponent {:.2f}".format(name, scaling["exponent"])
+    if "piecewise" in scaling:
+        piecewise = scaling["piecewise"]
+        line += " ({:.2f} below, {:.2f} above {:g})".format(
+            piecewise["lower"]["exponent"], piecewise["upper"]["exponent"],
+            piecewise["breakpoint"])
+    return line
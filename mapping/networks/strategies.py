@@ -0,0 +1,73 @@
+"""Placement and merger routing strategies of marocco selectable by name.
+
+The names are importable without marocco, so that the harness can sweep
+them, the strategies themselves are only imported when they are configured.
+The neuron size, the number of denmems per neuron, is configured here as
+well, as it is a parameter of the placement shared by all models.
+"""
+
+# "default" keeps the strategy marocco chooses itself
+PLACERS = ["default", "byNeuron", "byPopulation", "byEnum"]
+# placers only available in patched marocco versions
+EXPERIMENTAL_PLACERS = ["constrained"]
+
+MERGER_ROUTINGS = ["default", "one_to_one",
+                   "minimize_number_of_sending_repeaters",
+                   "minimize_as_possible"]
+
+
+def add_arguments(parser, placer="default", merger_routing="default",
+                  n_size=None):
+    parser.add_argument('--placer', type=str, default=placer,
+                        choices=PLACERS + EXPERIMENTAL_PLACERS,
+                        help='neuron placement strategy')
+    parser.add_argument('--merger_routing', type=str, default=merger_routing,
+                        choices=MERGER_ROUTINGS,
+                        help='merger routing strategy')
+    parser.add_argument('--n_size', type=int, default=n_size,
+                        help='size of one neuron in denmems, marocco\'s '
+                             'default if not given')
+
+
+def placement_strategy(placer):
+    if placer == "byNeuron":
+        from pymarocco_runtime import ClusterByNeuronConnectivity
+        return ClusterByNeuronConnectivity()  # cluster by neurons
+    if placer == "byPopulation":
+        from pymarocco_runtime import ClusterByPopulationConnectivity
+        return ClusterByPopulationConnectivity()
+    if placer == "byEnum":
+        from pymarocco_runtime import byNeuronBlockEnumAndPopulationIDasc
+        return byNeuronBlockEnumAndPopulationIDasc()
+    if placer == "constrained":
+        # needed for 5720 with patch set 36(best results) or ps 50
+        from pymarocco_runtime import ConstrainedNeuronClusterer
+        return ConstrainedNeuronClusterer()
+    raise ValueError("unknown placer {}".format(placer))
+
+
+def task_suffix(placer, merger_routing):
+    """suffix of the task name naming the strategies which are not default"""
+    suffix = ""
+    if placer != "default":
+        suffix += "_" + placer
+    if merger_routing != "default":
+        suffix += "_" + merger_routing
+    return suffix
+
+
+def configure(marocco, placer, merger_routing, n_size=None):
+    """Sets the strategies unless they are "default" and the neuron size
+    if given. Returns the suffix of the task name naming them, the neuron
+    size is part of the grid point and comes first."""
+    suffix = ""
+    if n_size is not None:
+        marocco.neuron_placement.default_neuron_size(n_size)
+        suffix += "_nsize{}".format(n_size)
+    if placer != "default":
+        marocco.neuron_placement.default_placement_strategy(
+            placement_strategy(placer))
+    if merger_routing != "default":
+        marocco.merger_routing.strategy(
+            getattr(marocco.merger_routing, merger_routing))
+    return suffix + task_suffix(placer, merger_routing)
@@ -0,0 +1,127 @@
+"""Vectorized generation of the synthetic connectivity.
+
+The neurons are split into equally sized populations arranged on a ring.
+Every connection draws its target neuron from the in-degree distribution,
+the population of its source with a probability decaying with the distance
+on the ring and the source neuron within that population from the
+out-degree distribution. No loop runs over neurons or connections, so that
+networks with millions of synapses are generated in seconds.
+"""
+
+import numpy as np
+
+INDEGREE_DISTRIBUTIONS = ["fixed", "poisson", "powerlaw"]
+OUTDEGREE_DISTRIBUTIONS = ["poisson", "powerlaw"]
+
+
+def degree_weights(distribution, size, gamma, rng):
+    """relative expected degrees with mean 1, a power law P(k) ~ k**-gamma
+    is heavy tailed, i.e. has a few hubs with a very large degree"""
+    if distribution == "powerlaw":
+        if gamma <= 2:
+            raise ValueError("power law exponent must be larger than 2 "
+                             "for a finite mean degree")
+        weights = rng.pareto(gamma - 1, size) + 1
+        return weights / weights.mean()
+    return np.ones(size)
+
+
+def population_probabilities(populations, locality, weights):
+    """Matrix of the probability of the source population (columns) of a
+    connection into each target population (rows). It decays as
+    exp(-distance / locality) with the distance on the ring, a locality of
+    0 connects all populations alike."""
+    index = np.arange(populations)
+    distance = np.abs(index[:, np.newaxis] - index[np.newaxis, :])
+    distance = np.minimum(distance, populations - distance)
+    if locality > 0:
+        probabilities = np.exp(-distance / float(locality))
+    else:
+        probabilities = np.ones((populations, populations))
+    probabilities *= weights[np.newaxis, :]
+    return probabilities / probabilities.sum(axis=1)[:, np.newaxis]
+
+
+def draw_rows(probabilities, rows, rng):
+    """Draws a column for each entry of rows from the distribution in the
+    row of probabilities, by one search in the cumulative distributions of
+    all rows shifted by the row index."""
+    cumulative = np.cumsum(probabilities, axis=1)
+    cumulative /= cumulative[:, -1:]
+    cumulative += np.arange(len(probabilities))[:, np.newaxis]
+    flat = np.searchsorted(cumulative.ravel(), rows + rng.random_sample(
+        len(rows)), side='right')
+    # rounding may leave the sum of a row slightly below 1
+    columns = flat - rows * probabilities.shape[1]
+    return np.minimum(columns, probabilities.shape[1] - 1)
+
+
+def generate(populations, pop_size, indegree, indegree_distribution="fixed",
+             outdegree_distribution="poisson", gamma=2.5, locality=0,
+             allow_self_connections=False, seed=42):
+    """
+        Generates the connections of the synthetic network.
+
+        Keywords:
+            --- populations: number of populations
+            --- pop_size: number of neurons per population
+            --- indegree: mean number of presynaptic partners per neuron
+            --- indegree_distribution: "fixed" gives every neuron exactly
+                indegree inputs, "poisson" draws the targets uniformly,
+                "powerlaw" from a power law with exponent gamma (fan-in)
+            --- outdegree_distribution: "poisson" or "powerlaw" (fan-out)
+            --- gamma: exponent of the power law
+            --- locality: decay length of the connection probability
+                between populations on the ring, 0 for none
+            --- seed: seed of the connectivity
+
+        Returns the global source and target neuron of each connection,
+        neuron i belongs to population i // pop_size.
+    """
+    rng = np.random.RandomState(seed)
+    neurons = populations * pop_size
+
+    if indegree_distribution == "fixed":
+        targets = np.repeat(np.arange(neurons), int(round(indegree)))
+    else:
+        inweights = degree_weights(indegree_distribution, neurons, gamma, rng)
+        cumulative = np.cumsum(inweights)
+        targets = np.searchsorted(
+            cumulative, rng.random_sample(int(round(indegree * neurons))) *
+            cumulative[-1], side='right')
+        targets = np.minimum(targets, neurons - 1)
+
+    outweights = degree_weights(outdegree_distribution, neurons, gamma, rng)
+    outweights = outweights.reshape(populations, pop_size)
+    source_populations = draw_rows(
+        population_probabilities(populations, locality,
+                                 outweights.sum(axis=1)),
+        targets // pop_size, rng)
+    sources = draw_rows(outweights, source_populations, rng) + \
+        source_populations * pop_size
+
+    if not allow_self_connections:
+        keep = sources != targets
+        sources, targets = sources[keep], targets[keep]
+    return sources, targets
+
+
+def split_projections(sources, targets, populations, pop_size):
+    """Groups the connections by pairs of populations. Returns a list of
+    (source population, target population, source indices, target indices)
+    with the indices within the populations."""
+    pairs = (sources // pop_size) * populations + targets // pop_size
+    order = np.argsort(pairs, kind='mergesort')
+    pairs, sources, targets = pairs[order], sources[order], targets[order]
+    boundaries = np.flatnonzero(np.diff(pairs)) + 1
+    projections = []
+    for start, stop in zip(np.concatenate(([0], boundaries)),
+                           np.concatenate((boundaries, [len(pairs)]))):
+        if start == stop:
+            continue
+        source_population, target_population = divmod(pairs[start],
+                                                       populations)
+        projections.append((int(source_population), int(target_population),
+                            sources[start:stop] % pop_size,
+                            targets[start:stop] % pop_size))
+    return projections
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+
+import argparse
+import os
+import sys
+
+import pyhmf as pynn
+import pymarocco
+import pyhalco_hicann_v2 as C
+from pymarocco import Defects
+
+from pysthal.command_line_util import init_logger
+init_logger("WARN", [])
+
+import connectivity
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+import artifacts
+import capacity
+import results
+import strategies
+
+
+class SyntheticNetwork(object):
+    def __init__(self, populations, pop_size, indegree, marocco,
+                 indegree_distribution="fixed",
+                 outdegree_distribution="poisson", gamma=2.5, locality=0,
+                 model=pynn.EIF_cond_exp_isfa_ista, seed=42):
+        """
+            Synthetic network stressing single stages of the mapping, see
+            connectivity.generate for the keywords. Many small populations
+            stress the placement, high fan-in the synapse drivers, high
+            fan-out and low locality the L1 routing.
+        """
+        self.populations = populations
+        self.pop_size = pop_size
+        self.indegree = indegree
+        self.indegree_distribution = indegree_distribution
+        self.outdegree_distribution = outdegree_distribution
+        self.gamma = gamma
+        self.locality = locality
+        self.model = model
+        self.marocco = marocco
+        self.seed = seed
+
+        pynn.setup(marocco=self.marocco)
+
+    def generate(self):
+        sources, targets = connectivity.generate(
+            self.populations, self.pop_size, self.indegree,
+            indegree_distribution=self.indegree_distribution,
+            outdegree_distribution=self.outdegree_distribution,
+            gamma=self.gamma, locality=self.locality, seed=self.seed)
+        self.connections = connectivity.split_projections(
+            sources, targets, self.populations, self.pop_size)
+        print("total connections:", len(sources))
+
+    def connectivity(self):
+        """population sizes and connections as built, see capacity.py"""
+        return [self.pop_size] * self.populations, self.connections
+
+    def build(self):
+        self.neurons = [pynn.Population(self.pop_size, self.model)
+                        for _ in range(self.populations)]
+
+        for source, target, pre, post in self.connections:
+            # the weight and delay are not important for the mapping
+            connector = pynn.FromListConnector(
+                list(zip(pre.tolist(), post.tolist(),
+                         [1.] * len(pre), [0.] * len(pre))))
+            pynn.Projection(self.neurons[source],
+                            self.neurons[target],
+                            connector,
+                            target='excitatory')
+
+    def run(self):
+        pynn.run(1)
+        pynn.end()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--populations', default=10, type=int)
+    parser.add_argument('--pop_size', default=100, type=int)
+    parser.add_argument('--indegree', default=20, type=float,
+                        help='mean number of presynaptic partners')
+    parser.add_argument('--indegree_distribution', default='fixed',
+                        choices=connectivity.INDEGREE_DISTRIBUTIONS)
+    parser.add_argument('--outdegree_distribution', default='poisson',
+                        choices=connectivity.OUTDEGREE_DISTRIBUTIONS)
+    parser.add_argument('--gamma', default=2.5, type=float,
+                        help='exponent of the power law degrees')
+    parser.add_argument('--locality', default=0, type=float,
+                        help='decay length of the connection probability '
+                             'in populations, 0 for none')
+    parser.add_argument('--name', default="synthetic_network", type=str)
+    parser.add_argument('--defects_path', type=str)
+    parser.add_argument('--wafer', '-w', type=int, default=24)
+    parser.add_argument('--seed', default=42, type=int,
+                        help='seed of the random connectivity')
+    strategies.add_arguments(parser)
+    artifacts.add_arguments(parser)
+    capacity.add_arguments(parser)
+    results.add_arguments(parser)
+
+    args = parser.parse_args()
+
+    taskname = "P{}_n{}_K{}_in{}_out{}_gamma{}_locality{}_wafer{}".format(
+        args.populations, args.pop_size, args.indegree,
+        args.indegree_distribution, args.outdegree_distribution, args.gamma,
+        args.locality, args.wafer)
+
+    marocco = pymarocco.PyMarocco()
+    marocco.continue_despite_synapse_loss = True
+    marocco.calib_backend = pymarocco.PyMarocco.CalibBackend.Default
+    marocco.calib_path = "/wang/data/calibration/brainscales/default"
+    marocco.default_wafer = C.Wafer(args.wafer)
+    marocco.defects.backend = Defects.Backend.XML
+
+    if args.defects_path:
+        marocco.defects.path = args.defects_path
+    else:
+        marocco.defects.path = "/wang/data/commissioning/BSS-1/rackplace/" + str(
+            args.wafer) + "/derived_plus_calib_blacklisting/current"
+
+    taskname += strategies.configure(marocco, args.placer, args.merger_routing,
+                                     args.n_size)
+    marocco.persist = artifacts.filename(args.name, taskname,
+                                         args.persist_format)
+
+    result = results.Result(args.name, taskname, marocco=marocco,
+                            profile=args.profile,
+                            seed=args.seed, wafer=args.wafer,
+                            placer=args.placer,
+                            merger_routing=args.merger_routing,
+                            n_size=args.n_size,
+                            populations=args.populations,
+                            pop_size=args.pop_size,
+                            indegree=args.indegree,
+                            indegree_distribution=args.indegree_distribution,
+                            outdegree_distribution=args.outdegree_distribution,
+                            gamma=args.gamma,
+                            locality=args.locality)
+    try:
+        result.enter("generate")
+        r = SyntheticNetwork(args.populations, args.pop_size, args.indegree,
+                             marocco,
+                             indegree_distribution=args.indegree_distribution,
+                             outdegree_distribution=args.outdegree_distribution,
+                             gamma=args.gamma, locality=args.locality,
+                             seed=args.seed)
+        r.generate()
+        if capacity.analyse(result, r, args, marocco):
+            return
+        result.enter("build")
+        r.build()
+        result.enter("mapping")
+        r.run()
+        result.collect_statistics(marocco)
+    except RuntimeError as err:
+        # couldn't place all populations
+        result.fail(err)
+    result.finish()
+    result.write()
+
+    if result.failed:
+        sys.exit(results.EXIT_FAILED)
+
+
+if __name__ == '__main__':
+    main()
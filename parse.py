@@ -1,40 +1,272 @@
 #!/usr/bin/env python
 
 import argparse
-import itertools as it
+from collections import defaultdict
+import glob
+import gzip
 import json
 import multiprocessing as mp
+import os
+import shutil
 import subprocess
-import traceback
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "mapping", "networks"))
+import artifacts
+import capacity
+import events
+import results
+import strategies
+
+import history
+import spec
+
+
+def srun(resources):
+    """srun call requesting the resources of a benchmark, see spec.py"""
+    call = ["srun", "-p", "jenkins"]
+    resources = resources or {}
+    if "memory" in resources:
+        call.append("--mem={}M".format(int(resources["memory"])))
+    if "time" in resources:
+        call.append("--time={}".format(int(resources["time"])))
+    if "cpus" in resources:
+        call.append("--cpus-per-task={}".format(resources["cpus"]))
+    return call
+
+
+def call(command, options, cwd=None, native_profile=None, resources=None,
+         log=None, job=None):
+    """Calls the benchmark command and returns its status, which is
+    "success", "failed" if the mapping failed or "crashed" if no result was
+    written. If native_profile is given, the call is sampled by py-spy
+    including native stacks and the folded stacks are written there.
+
+    stdout and stderr, which includes the log of marocco, are appended to
+    the gzip file log, repeated calls add members to it. The job is passed
+    to the events of the benchmark script, see events.py."""
+    call = ["python"] + command.split(" ")
+    if native_profile:
+        call = ["py-spy", "record", "--native", "--format", "raw",
+                "--output", native_profile, "--"] + call
+    if options["useslurm"]:
+        call = srun(resources) + call
+    environment = dict(os.environ, **{events.JOB: job}) if job else None
+    if log is None:
+        returncode = subprocess.call(call, cwd=cwd, env=environment)
+    else:
+        with gzip.open(log, 'ab') as logfile:
+            process = subprocess.Popen(call, cwd=cwd, env=environment,
+                                       stdout=subprocess.PIPE,
+                                       stderr=subprocess.STDOUT)
+            shutil.copyfileobj(process.stdout, logfile)
+            returncode = process.wait()
+    if returncode == 0:
+        return "success"
+    if returncode == results.EXIT_FAILED:
+        print("____________failed: ", command)
+        return "failed"
+    print("ERROR: {}: exit code {}{}".format(
+        command, returncode, ", see " + log if log else ""))
+    return "crashed"
+
+
+def tail(log, lines=20):
+    """the last lines of a gzip log"""
+    with gzip.open(log, 'rt', errors='replace') as logfile:
+        return "".join(logfile.readlines()[-lines:])
+
+
+def overfull(command, options, resources=None):
+    """Runs the benchmark command with --capacity_only and returns whether
+    the network exceeds the synapse capacity of its neurons, see
+    capacity.py. Returns None for models without capacity estimates, which
+    are not started."""
+    script, _, arguments = command.partition(" ")
+    if os.path.basename(os.path.dirname(script)) not in capacity.MODELS:
+        return None
+    call = ["python", os.path.abspath(script)] + arguments.split(" ") + \
+        ["--capacity_only"]
+    if options["useslurm"]:
+        call = srun(resources) + call
+    workdir = tempfile.mkdtemp(prefix="capacity_", dir=os.getcwd())
+    try:
+        with open(os.devnull, 'w') as devnull:
+            subprocess.check_call(call, cwd=workdir, stdout=devnull,
+                                  stderr=devnull)
+        estimatefile, = glob.glob(os.path.join(workdir, "*_capacity.json"))
+        with open(estimatefile) as infile:
+            return json.load(infile)["exceeds"]
+    except (subprocess.CalledProcessError, ValueError):
+        return None
+    finally:
+        shutil.rmtree(workdir)
+
+
+def repeat(command, options, repetitions, native_profile=None,
+           resources=None, log=None, job=None):
+    """Calls the benchmark command warmup + repetitions times, each time in
+    a separate directory, and writes the aggregated record of the measured
+    repetitions to the current directory. Warmup runs are discarded. If
+    vary_seed is set, the measured repetitions get the seeds 0, 1, ..."""
+    # scripts are given relative to the benchmark directory
+    script, _, arguments = command.partition(" ")
+    command = os.path.abspath(script) + " " + arguments
+    warmup = options["warmup"]
+    records = []
+    for index in range(warmup + repetitions):
+        current = command
+        if options["vary_seed"] and index >= warmup:
+            current += " --seed {}".format(index - warmup)
+        workdir = tempfile.mkdtemp(prefix="repetition_", dir=os.getcwd())
+        status = call(current, options, cwd=workdir,
+                      native_profile=native_profile, resources=resources,
+                      log=log, job=job)
+        if status == "crashed":
+            shutil.rmtree(workdir)
+            return status
+        if index >= warmup:
+            resultfile, = glob.glob(os.path.join(workdir, "*_results.json"))
+            records.append(results.load(resultfile))
+            # mapping results and profiles of the last repetition are kept
+            for artifact in os.listdir(workdir):
+                if artifact != os.path.basename(resultfile):
+                    shutil.move(os.path.join(workdir, artifact), artifact)
+        shutil.rmtree(workdir)
+
+    # a grid point is only reported if all repetitions succeeded
+    failed = [record for record in records if not results.succeeded(record)]
+    if failed:
+        record = failed[0]
+        record["repetitions"] = len(records)
+        record["failed_repetitions"] = len(failed)
+    else:
+        record = results.aggregate(records)
+    # the mapping results of all repetitions are indexed, see artifacts.index
+    stored = [r["artifact"] for r in records if "artifact" in r]
+    if stored:
+        record["artifacts"] = stored
+    results.write(record)
+    return "failed" if failed else "success"
+
+
+def queue(job, options):
+    """announces the job and returns the arguments of run"""
+    events.emit("queued", job=spec.identifier(job), model=job["name"],
+                arguments=job["arguments"], resources=job["resources"])
+    return job, options
+
 
 def run(args):
-    """The args tuple needs to be formatted as follows:
-    args[0]: tuple of values for the arguments
-    args[1]: tuple of command line arguments
-    args[2]: basecommand to call on the commandline with above arguments
-    args[3]: name of the mapping problem
-    args[4]: useslurm"""
-    argtuple, argnames, basecommand, name, useslurm = args
-    argstr = " "
-    for argname, argvalue in zip(argnames, argtuple):
-        argstr += "{} {} ".format(argname, argvalue)
-    command = basecommand + argstr + "--name {}".format(name)
+    """Runs a job of the benchmark specification, see spec.expand, with the
+    dict of the options given on the command line of this script. Returns a
+    tuple of the command and its status, see call."""
+    job, options = args
+    command = spec.command(job)
+    if options["profile"]:
+        command += " --profile"
+    identifier = spec.identifier(job)
+    log = None
+    if options["logs"]:
+        log = os.path.join(options["logs"], identifier + ".log.gz")
+        # a rerun replaces the log of the earlier run
+        if os.path.exists(log):
+            os.remove(log)
     print("____________command: ", command)
-    if useslurm:
-        try:
-            subprocess.check_call(["srun", "-p", "jenkins", "python"] +
-                                  command.split(" "))
-        except:
-            raise Exception('ERROR: {}: {}'.format(
-                                                command,
-                                                traceback.format_exc()))
+    events.emit("started", job=identifier, command=command, log=log)
+    start = time.time()
+    resources = job["resources"]
+
+    if options["skip_overfull"] and overfull(command, options, resources):
+        print("____________skipped, exceeds the synapse capacity: ", command)
+        events.emit("finished", job=identifier, status="skipped",
+                    duration=time.time() - start)
+        return command, "skipped"
+
+    native_profile = None
+    if options["profile_native"]:
+        # the task name is only known to the benchmark script
+        native_profile = os.path.abspath(identifier + "_native.txt")
+
+    # the repetitions of the command line overwrite those of the benchmark
+    repetitions = options["repetitions"] or job["repetitions"]
+    if repetitions == 1 and options["warmup"] == 0 and \
+            not options["vary_seed"]:
+        status = call(command, options, native_profile=native_profile,
+                      resources=resources, log=log, job=identifier)
     else:
-        try:
-            subprocess.check_call(["python"] + command.split(" "))
-        except:
-            raise Exception('ERROR: {}: {}'.format(
-                                                command,
-                                                traceback.format_exc()))
+        status = repeat(command, options, repetitions,
+                        native_profile=native_profile, resources=resources,
+                        log=log, job=identifier)
+    finished = {"job": identifier, "status": status,
+                "duration": time.time() - start, "log": log}
+    if status == "crashed" and log:
+        # crashed jobs wrote no record with the error
+        finished["log_tail"] = tail(log)
+    events.emit("finished", **finished)
+    return command, status
+
+
+def previous(job, records):
+    """the records of earlier runs of the job ordered by time, the records
+    are keyed by model name"""
+    return sorted((record for record in records.get(job["name"], [])
+                   if spec.recorded(job, record)),
+                  key=lambda record: record["timestamp"])
+
+
+def rerun(job, records, options):
+    """whether the job is selected by --only_failed or --only_missing, jobs
+    which crashed left no record and count as missing"""
+    runs = previous(job, records)
+    if not runs:
+        return options["only_missing"]
+    return options["only_failed"] and not results.succeeded(runs[-1])
+
+
+def predict(job, records, options):
+    """Predicts the duration of the job in seconds from the median
+    total_time of its earlier runs. Returns the duration and the number of
+    runs it is based on, or the time limit of the benchmark and 0 if it was
+    never run, None and 0 if neither is known."""
+    times = [results.metrics(record).get("total_time")
+             for record in previous(job, records)]
+    times = [time for time in times if time is not None]
+    calls = (options["repetitions"] or job["repetitions"]) + \
+        options["warmup"]
+    if times:
+        return float(np.median(times)) * calls, len(times)
+    if "time" in job["resources"]:
+        return job["resources"]["time"] * 60. * calls, 0
+    return None, 0
+
+
+def dry_run(jobs, records, options):
+    """prints the jobs with their predicted duration instead of running
+    them"""
+    total = 0.
+    unknown = 0
+    count = 0
+    for job, _ in jobs:
+        count += 1
+        duration, runs = predict(job, records, options)
+        if duration is None:
+            unknown += 1
+            prediction = "unknown"
+        elif runs:
+            total += duration
+            prediction = "{:.1f} s from {} runs".format(duration, runs)
+        else:
+            total += duration
+            prediction = "{:.1f} s time limit".format(duration)
+        print("{:<100} {}".format(spec.command(job), prediction))
+    print("{} jobs, predicted {:.2f} h serial time, {} without "
+          "prediction".format(count, total / 3600., unknown))
 
 
 parser = argparse.ArgumentParser()
@@ -48,49 +280,196 @@ parser.add_argument('--processes', default=20, type=int,
                          ' will be blocked by the srun call anyways.')
 parser.add_argument('--global_defects_path', type=str)
 parser.add_argument('--global_wafer', type=int)
+parser.add_argument('--repetitions', type=int,
+                    help='Number of measured runs per grid point, the result'
+                         ' reports median, interquartile range and minimum'
+                         ' of every metric. Overwrites the repetitions of the'
+                         ' benchmarks, which default to 1.')
+parser.add_argument('--warmup', default=0, type=int,
+                    help='Number of discarded runs per grid point before the'
+                         ' measured repetitions.')
+parser.add_argument('--vary_seed', action='store_true', default=False,
+                    help='Use a different seed for each repetition to capture'
+                         ' the variance of the synapse loss.')
+parser.add_argument('--profile', action='store_true', default=False,
+                    help='Store cProfile statistics of each phase next to the'
+                         ' results, see profiles.py for the aggregation.')
+parser.add_argument('--profile_native', action='store_true', default=False,
+                    help='Sample each benchmark including native stacks with'
+                         ' py-spy, which needs to be installed.')
+parser.add_argument('--placers', nargs='+',
+                    choices=strategies.PLACERS +
+                    strategies.EXPERIMENTAL_PLACERS + ['all'],
+                    help='Sweep these placement strategies for every model,'
+                         ' overwrites the --placer of the benchmarks. "all"'
+                         ' selects all but the experimental placers.')
+parser.add_argument('--merger_routings', nargs='+',
+                    choices=strategies.MERGER_ROUTINGS + ['all'],
+                    help='Sweep these merger routing strategies for every'
+                         ' model, "all" selects all strategies.')
+parser.add_argument('--skip_overfull', action='store_true', default=False,
+                    help='Estimate the capacity of each network before its'
+                         ' mapping and skip networks with more inputs to a'
+                         ' neuron than its synapses, see capacity.py.')
+parser.add_argument('--history', type=str,
+                    help='Add the results to this history database, see'
+                         ' history.py.')
+parser.add_argument('--n_sizes', nargs='+', type=int,
+                    help='Sweep these neuron sizes for every model,'
+                         ' overwrites the --n_size of the benchmarks.')
+parser.add_argument('--benchmarks', default='benchmarks.json',
+                    help='Benchmark specification, see spec.py.')
+parser.add_argument('--suite', type=str,
+                    help='Only run the benchmarks of this suite of the'
+                         ' specification. Without a suite, the large'
+                         ' benchmarks only run if selected by --tags or by'
+                         ' their name in --models.')
+parser.add_argument('--models', nargs='+',
+                    help='Only run the benchmarks of these models, shell'
+                         ' patterns like "synthetic_*" are allowed.')
+parser.add_argument('--tags', nargs='+',
+                    help='Only run the benchmarks with one of these tags.')
+parser.add_argument('--where', nargs='+', default=[],
+                    help='Only run the jobs whose arguments meet all these'
+                         ' conditions, e.g. "N<=800" "n_size=4,8". Jobs'
+                         ' without the argument are skipped.')
+parser.add_argument('--only_failed', action='store_true', default=False,
+                    help='Only run the jobs whose latest result in the'
+                         ' current directory is a failed mapping.')
+parser.add_argument('--only_missing', action='store_true', default=False,
+                    help='Only run the jobs without a result in the current'
+                         ' directory, which includes crashed jobs.')
+parser.add_argument('--dry_run', action='store_true', default=False,
+                    help='Print the selected jobs with their duration'
+                         ' predicted from earlier results in the current'
+                         ' directory and the --history database instead of'
+                         ' running them.')
+parser.add_argument('--logs', default='logs',
+                    help='Directory of the gzip compressed output of each'
+                         ' job, an empty string prints the output instead.')
+parser.add_argument('--events', default='events.jsonl',
+                    help='File the events of the sweep are appended to as'
+                         ' json lines, see events.py. An empty string'
+                         ' disables the events.')
+parser.add_argument('--artifacts', type=str,
+                    help='Move the persisted mapping results into this'
+                         ' content addressed store, see artifacts.py.')
+parser.add_argument('--keep_last', type=int,
+                    help='After the sweep, forget all but the latest runs of'
+                         ' every grid point in the --artifacts store.')
+parser.add_argument('--max_artifact_size', type=float,
+                    help='After the sweep, remove the least recently used'
+                         ' mapping results until the --artifacts store is'
+                         ' below this size in GB.')
+parser.add_argument('--persist_format', choices=artifacts.FORMATS,
+                    help='Format of the persisted mapping results for every'
+                         ' model, the binary formats are faster.')
 args = parser.parse_args()
-benchmarks = json.load(open("benchmarks.json", "r"))
+if args.placers == ['all']:
+    args.placers = strategies.PLACERS
+if args.merger_routings == ['all']:
+    args.merger_routings = strategies.MERGER_ROUTINGS
+benchmarks = spec.select(spec.load(args.benchmarks), args.suite, args.tags,
+                         args.models)
+
+# arguments of the command line overwrite those of every benchmark
+overrides = {}
+if args.global_defects_path:
+    overrides["--defects_path"] = [args.global_defects_path]
+if args.global_wafer:
+    overrides["--wafer"] = [args.global_wafer]
+# neuron size and strategy dimensions for all models
+if args.n_sizes:
+    overrides["--n_size"] = args.n_sizes
+if args.placers:
+    overrides["--placer"] = args.placers
+if args.merger_routings:
+    overrides["--merger_routing"] = args.merger_routings
+if args.persist_format:
+    overrides["--persist_format"] = [args.persist_format]
+
+try:
+    conditions = [spec.condition(text) for text in args.where]
+except ValueError as err:
+    parser.error(str(err))
+jobs = spec.select_jobs(spec.expand(benchmarks, overrides), args.models,
+                        args.tags, conditions)
+
+# earlier results select the jobs to rerun and predict their duration
+records = defaultdict(list)
+if args.only_failed or args.only_missing or args.dry_run:
+    for filename in glob.glob("*_results.json"):
+        record = results.load(filename)
+        records[record["model"]].append(record)
+    if args.history and args.dry_run:
+        connection = history.connect(args.history)
+        for benchmark in benchmarks:
+            name = benchmark["model"]["name"]
+            # results of this directory may be in the history already
+            known = set(record["timestamp"] for record in records[name])
+            records[name] += [record for record in
+                              history.records(connection, name)
+                              if record["timestamp"] not in known]
+if args.only_failed or args.only_missing:
+    jobs = (job for job in jobs if rerun(job, records, vars(args)))
+
+if args.dry_run:
+    dry_run(((job, vars(args)) for job in jobs), records, vars(args))
+    sys.exit(0)
+
+# the logs are written from the working directories of the repetitions
+if args.logs:
+    args.logs = os.path.abspath(args.logs)
+    if not os.path.isdir(args.logs):
+        os.makedirs(args.logs)
+# inherited by the benchmark scripts
+if args.events:
+    os.environ[events.EVENTS] = os.path.abspath(args.events)
+if args.artifacts:
+    os.environ[artifacts.STORE] = os.path.abspath(args.artifacts)
+jobs = (queue(job, vars(args)) for job in jobs)
 
 if args.multiprocessing:
     # as the pool only holds processes waiting for srun to return
     # the number is not particularly critical, should be larger than
     # number of available slurm jobs
     pool = mp.Pool(processes=args.processes)
+    statuses = list(pool.imap(run, jobs))
+    pool.close()
+else:
+    statuses = [run(job) for job in jobs]
 
-argtuples = []
-
-for item in benchmarks:
-    name = item["model"]["name"]
-    basecommand = item['tasks']['command']
-    arguments = item['tasks']['arguments']
-    argnames = []
-    argvalues = []
-
-    for argumentname, argumentvalues in arguments.items():
-        if("--defects_path" in argumentname and args.global_defects_path):
-            continue
-        if("--wafer" in argumentname and args.global_wafer):
-            continue
-        argnames.append(argumentname)
-        argvalues.append(argumentvalues)
-
-    # overwrites defects_path with global_defects_path
-    if args.global_defects_path:
-        argnames.append("--defects_path")
-        argvalues.append([args.global_defects_path])
-
-    # overwrites --wafer with --global_wafer
-    if(args.global_wafer):
-        argnames.append("--wafer")
-        argvalues.append([args.global_wafer])
-
-    if args.multiprocessing:
-        argtuples += [(at, argnames, basecommand, name, args.useslurm)
-                      for at in it.product(*argvalues)]
-    else:
-        for argtuple in it.product(*argvalues):
-            run((argtuple, argnames, basecommand, name, args.useslurm))
+# failed mappings are valid benchmark results, crashed jobs are not
+for status in ["skipped", "failed", "crashed"]:
+    commands = [command for command, s in statuses if s == status]
+    print("{} of {} jobs {}".format(len(commands), len(statuses), status))
+    for command in commands:
+        print("    " + command)
 
-if args.multiprocessing:
-    pool.map(run, argtuples)
-    pool.close()
\ No newline at end of file
+if args.history or args.artifacts:
+    records = [results.load(filename)
+               for filename in glob.glob("*_results.json")]
+
+# the jobs only move their mapping results into the store, the index is
+# written here, as sqlite locks are unreliable on the network file systems
+# the jobs share the store over
+if args.artifacts:
+    print("Indexed {} mapping results in {}".format(
+        artifacts.index(args.artifacts, records), args.artifacts))
+
+if args.history:
+    print("Added {} records to {}".format(
+        history.ingest(history.connect(args.history), records),
+        args.history))
+
+if args.artifacts and (args.keep_last is not None or
+                       args.max_artifact_size is not None):
+    max_size = None
+    if args.max_artifact_size is not None:
+        max_size = int(args.max_artifact_size * 1024 ** 3)
+    count, size = artifacts.evict(args.artifacts, args.keep_last, max_size)
+    print("Removed {} mapping results, {:.2f} GB from {}".format(
+        count, size / 1024. ** 3, args.artifacts))
+
+if any(s == "crashed" for _, s in statuses):
+    sys.exit(1)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+import argparse
+from collections import Counter, defaultdict
+import glob
+import os
+import pstats
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "mapping", "networks"))
+import results
+
+# contributions below this time in seconds or this fraction of the total
+# time are dropped from the stacks
+MIN_TIME = 1e-6
+MIN_FRACTION = 1e-4
+# deeper stacks are cut, the time below is attributed to a "..." frame
+MAX_DEPTH = 40
+
+
+def label(func):
+    filename, lineno, name = func
+    return "{} ({}:{})".format(name, os.path.basename(filename),
+                               lineno).replace(";", ",")
+
+
+def folded_stacks(stats):
+    """Converts pstats statistics into folded stacks, which flamegraph.pl
+    and speedscope read: one line per stack with the frames separated by
+    ';' followed by the time in microseconds.
+
+    cProfile only records the callers of each function, the time of a
+    function is hence distributed to its callers in proportion to the
+    cumulative time spent in each call.
+
+    The number of call paths grows exponentially with the depth if helpers
+    are shared by many callers. As the time is split among the paths, the
+    relative cut-off bounds the number of paths per depth, and the depth is
+    limited by MAX_DEPTH. Recursive calls are not followed."""
+    data = stats.stats
+    callees = defaultdict(dict)
+    for func, (cc, nc, tt, ct, callers) in data.items():
+        for caller, (_, _, _, caller_ct) in callers.items():
+            callees[caller][func] = caller_ct
+
+    stacks = Counter()
+    roots = [func for func, (_, _, _, _, callers) in data.items()
+             if not callers]
+    cutoff = max(MIN_TIME,
+                 MIN_FRACTION * sum(data[func][3] for func in roots))
+
+    def walk(func, stack, visited, time):
+        cc, nc, tt, ct, callers = data[func]
+        if time < cutoff or ct <= 0:
+            return
+        stack = stack + [label(func)]
+        if len(stack) >= MAX_DEPTH:
+            stacks[";".join(stack + ["..."])] += time
+            return
+        share = time / ct
+        stacks[";".join(stack)] += tt * share
+        for callee, callee_time in callees[func].items():
+            # recursive calls are already contained in the cumulative time
+            if callee not in visited:
+                walk(callee, stack, visited | set([callee]),
+                     callee_time * share)
+
+    for func in roots:
+        walk(func, [], set([func]), data[func][3])
+    return stacks
+
+
+def read_folded(filename):
+    stacks = Counter()
+    with open(filename) as f:
+        for line in f:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            if stack:
+                stacks[stack] += float(count)
+    return stacks
+
+
+def write_folded(stacks, filename, scale=1.):
+    with open(filename, 'w') as f:
+        for stack, value in sorted(stacks.items()):
+            if int(value * scale) > 0:
+                f.write("{} {}\n".format(stack, int(value * scale)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Aggregates the profiles of all grid points of a model '
+                    'into one profile and one folded stack file per phase, '
+                    'render the folded stacks with flamegraph.pl or '
+                    'speedscope.')
+    parser.add_argument('directory', nargs='?', default='.',
+                        help='directory with the results and profiles')
+    parser.add_argument('--output', default='.',
+                        help='directory to write the aggregated profiles to')
+    args = parser.parse_args()
+
+    # model -> phase -> profile files
+    profiles = defaultdict(lambda: defaultdict(list))
+    models = set()
+    for filename in glob.glob(os.path.join(args.directory,
+                                           "*_results.json")):
+        record = results.load(filename)
+        models.add(record["model"])
+        for phase, profile in record.get("profiles", {}).items():
+            profile = os.path.join(args.directory, profile)
+            if os.path.exists(profile):
+                profiles[record["model"]][phase].append(profile)
+
+    for model in sorted(profiles):
+        for phase, files in sorted(profiles[model].items()):
+            stats = pstats.Stats(files[0])
+            if len(files) > 1:
+                stats.add(*files[1:])
+            prefix = os.path.join(args.output, "{}_{}".format(model, phase))
+            stats.dump_stats(prefix + ".prof")
+            # seconds to microseconds
+            write_folded(folded_stacks(stats), prefix + ".folded", 1e6)
+            print("{} {}: {} profiles aggregated in {}.folded".format(
+                model, phase, len(files), prefix))
+
+    # folded stacks sampled by py-spy, see parse.py --profile_native
+    for model in sorted(models):
+        files = glob.glob(os.path.join(args.directory,
+                                       "{}_*_native.txt".format(model)))
+        if not files:
+            continue
+        stacks = Counter()
+        for filename in files:
+            stacks.update(read_folded(filename))
+        prefix = os.path.join(args.output, "{}_native".format(model))
+        write_folded(stacks, prefix + ".folded")
+        print("{} native: {} sampled runs aggregated in {}.folded".format(
+            model, len(files), prefix))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+import argparse
+from collections import defaultdict
+import glob
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "mapping", "networks"))
+import results
+import strategies
+
+
+def strategy(record):
+    return (record.get("placer", "default"),
+            record.get("merger_routing", "default"))
+
+
+def grid_point(record):
+    """task name without the strategy suffix"""
+    suffix = strategies.task_suffix(*strategy(record))
+    if suffix and record["task"].endswith(suffix):
+        return record["task"][:-len(suffix)]
+    return record["task"]
+
+
+def mean(values):
+    return float(np.mean(values)) if values else None
+
+
+def rank_model(records):
+    """Ranks the strategies of one model. Mapping time, synapse loss and
+    merger usage are only compared on the grid points every strategy mapped
+    successfully."""
+    runs = defaultdict(dict)
+    for record in records:
+        runs[strategy(record)][grid_point(record)] = record
+
+    common = None
+    for points in runs.values():
+        mapped = set(point for point, record in points.items()
+                     if results.succeeded(record))
+        common = mapped if common is None else common & mapped
+
+    rows = []
+    for (placer, merger_routing), points in runs.items():
+        values = [results.metrics(points[point]) for point in sorted(common)]
+        rows.append({
+            "placer": placer,
+            "merger_routing": merger_routing,
+            "runs": len(points),
+            "failed": sum(not results.succeeded(r) for r in points.values()),
+            "compared": len(values),
+            "mapping_time": float(sum(v["setup_time"] for v in values)),
+            "relative_loss": mean(
+                [v["synapse_loss"] / float(max(v["synapses"], 1))
+                 for v in values]),
+            # lost in the L1 routing, which the merger routing sets up
+            "relative_l1_loss": mean(
+                [v["synapse_loss_after_l1"] / float(max(v["synapses"], 1))
+                 for v in values]),
+            # not stored by older results
+            "mergers": mean([v["mergers"] for v in values
+                             if "mergers" in v]),
+        })
+    for key in ["mapping_time", "relative_loss", "relative_l1_loss"]:
+        order = sorted(range(len(rows)),
+                       key=lambda i: (rows[i]["failed"], rows[i][key]))
+        for rank, i in enumerate(order):
+            rows[i]["rank_" + key] = rank + 1
+    return sorted(rows, key=lambda row: row["rank_mapping_time"])
+
+
+def optional(value, form):
+    return "-" if value is None else form.format(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Ranks the placement and merger routing strategies of '
+                    'each model by mapping time, synapse loss and L1 loss '
+                    'and shows their merger usage, see the --placers and '
+                    '--merger_routings options of parse.py.')
+    parser.add_argument('directory', nargs='?', default='.',
+                        help='directory with the results')
+    parser.add_argument('--report', default='strategy_ranking.json',
+                        help='file to write the json ranking to')
+    args = parser.parse_args()
+
+    records = defaultdict(list)
+    for filename in glob.glob(os.path.join(args.directory,
+                                           "*_results.json")):
+        record = results.load(filename)
+        records[record["model"]].append(record)
+
+    ranking = {}
+    # mean ranks over all models
+    overall = defaultdict(list)
+    for model in sorted(records):
+        ranking[model] = rank_model(records[model])
+        print(model)
+        print("    {:<14} {:<38} {:>6} {:>8} {:>10} {:>8} {:>8} {:>8}".format(
+            "placer", "merger routing", "failed", "compared",
+            "time [s]", "loss", "L1 loss", "mergers"))
+        for row in ranking[model]:
+            print("    {placer:<14} {merger_routing:<38} {failed:>6} "
+                  "{compared:>8} {mapping_time:>10.1f} {loss:>8} "
+                  "{l1_loss:>8} {used:>8}".format(
+                      loss=optional(row["relative_loss"], "{:.4f}"),
+                      l1_loss=optional(row["relative_l1_loss"], "{:.4f}"),
+                      used=optional(row["mergers"], "{:.1f}"), **row))
+            overall[(row["placer"], row["merger_routing"])].append(
+                (row["rank_mapping_time"], row["rank_relative_loss"],
+                 row["rank_relative_l1_loss"]))
+
+    print("mean rank over {} models (time, loss, L1 loss)".format(
+        len(ranking)))
+    for (placer, merger_routing), ranks in sorted(
+            overall.items(), key=lambda item: np.mean(item[1], axis=0)[0]):
+        print("    {:<14} {:<38} {:.1f} {:.1f} {:.1f}".format(
+            placer, merger_routing, *np.mean(ranks, axis=0)))
+
+    with open(args.report, 'w') as outfile:
+        json.dump(ranking, outfile, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,368 @@
+"""Benchmark specification, see benchmarks.json.
+
+The specification holds the benchmarks and named suites of them:
+
+    {
+      "suites": {"nightly": ["nightly"], "ising": ["ising2d_network", ...]},
+      "benchmarks": [
+        {
+          "model": {"name": "random30_network", "description": "..."},
+          "tags": ["random", "nightly"],
+          "resources": {"memory": 4096, "time": 60, "cpus": 1},
+          "repetitions": 1,
+          "tasks": {
+            "command": "mapping/networks/random/run.py",
+            "fixed": {"--prob": 0.3},
+            "arguments": {"--N": [100, 200], "--n_size": [2, 4, 8]},
+            "zip": [{"--scale": [0.1, 0.2], "--k_scale": [1.0, 0.5]}],
+            "exclude": [{"--N": {"max": 100}, "--n_size": [4, 8]}]
+          }
+        }
+      ]
+    }
+
+Every job of a benchmark takes one value of each of the "arguments", the
+cartesian product, and one position of each "zip" group, whose arguments
+vary together. Jobs matching all arguments of an "exclude" entry are
+dropped, an entry matches a value, a list of values or a range with "min"
+and "max". The "fixed" arguments are passed to every job, the command may
+contain fixed arguments as well. Suites select benchmarks by tag or model
+name. The resources are hints for the scheduler, the memory in MB and the
+time in minutes.
+
+A plain list of benchmarks, the former format, is a specification without
+suites. The jobs are expanded lazily, so that a large sweep is never held
+in memory, and filtered lazily by model, tag and argument values.
+
+Benchmarks with a tag of OPT_IN, e.g. the full-scale runs which take hours
+and tens of GB, are left out unless a suite, a tag or the model name selects
+them.
+"""
+
+import fnmatch
+import itertools as it
+import json
+import operator
+import re
+
+# subset of json schema, see validate
+SCHEMA = {
+    "type": "object",
+    "additionalProperties": False,
+    "required": ["benchmarks"],
+    "properties": {
+        "suites": {
+            "type": "object",
+            "additionalProperties": {"type": "array",
+                                     "items": {"type": "string"}}},
+        "benchmarks": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "additionalProperties": False,
+                "required": ["model", "tasks"],
+                "properties": {
+                    "model": {
+                        "type": "object",
+                        "required": ["name"],
+                        "properties": {"name": {"type": "string"},
+                                       "description": {"type": "string"}}},
+                    "tags": {"type": "array", "items": {"type": "string"}},
+                    "resources": {
+                        "type": "object",
+                        "additionalProperties": False,
+                        "properties": {"memory": {"type": "number",
+                                                  "minimum": 1},
+                                       "time": {"type": "number",
+                                                "minimum": 1},
+                                       "cpus": {"type": "integer",
+                                                "minimum": 1}}},
+                    "repetitions": {"type": "integer", "minimum": 1},
+                    "tasks": {
+                        "type": "object",
+                        "additionalProperties": False,
+                        "required": ["command"],
+                        "properties": {
+                            "command": {"type": "string"},
+                            "fixed": {"type": "object",
+                                      "additionalProperties": {
+                                          "type": "scalar"}},
+                            "arguments": {"type": "object",
+                                          "additionalProperties": {
+                                              "type": "array",
+                                              "items": {"type": "scalar"}}},
+                            "zip": {"type": "array",
+                                    "items": {
+                                        "type": "object",
+                                        "additionalProperties": {
+                                            "type": "array",
+                                            "items": {"type": "scalar"}}}},
+                            "exclude": {"type": "array",
+                                        "items": {"type": "object"}}}}}}}}}
+
+# tags of benchmarks which only run if selected explicitly, see select
+OPT_IN = ["large"]
+
+# comparisons of argument values in conditions, see condition
+OPERATORS = [("<=", operator.le), (">=", operator.ge), ("!=", operator.ne),
+             ("<", operator.lt), (">", operator.gt), ("=", None)]
+
+TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "number": (int, float),
+    "integer": int,
+    "scalar": (str, int, float, bool),
+}
+
+
+def validate(instance, schema=SCHEMA, path="benchmarks.json"):
+    """Raises a ValueError naming the first entry violating the schema,
+    supports type, required, properties, additionalProperties, items and
+    minimum."""
+    expected = TYPES[schema["type"]]
+    # booleans are integers in python but not in json
+    if not isinstance(instance, expected) or (
+            isinstance(instance, bool) and schema["type"] != "scalar"):
+        raise ValueError("{}: expected {}, got {!r}".format(
+            path, schema["type"], instance))
+    if "minimum" in schema and instance < schema["minimum"]:
+        raise ValueError("{}: {!r} is smaller than {}".format(
+            path, instance, schema["minimum"]))
+    if schema["type"] == "array":
+        for index, item in enumerate(instance):
+            validate(item, schema.get("items", {"type": "scalar"}),
+                     "{}[{}]".format(path, index))
+    if schema["type"] != "object":
+        return
+    for key in schema.get("required", []):
+        if key not in instance:
+            raise ValueError("{}: {} is missing".format(path, key))
+    properties = schema.get("properties", {})
+    additional = schema.get("additionalProperties", True)
+    for key, value in instance.items():
+        subpath = "{}.{}".format(path, key)
+        if key in properties:
+            validate(value, properties[key], subpath)
+        elif additional is False:
+            raise ValueError("{}: unknown entry".format(subpath))
+        elif additional is not True:
+            validate(value, additional, subpath)
+
+
+def check(specification):
+    """consistency beyond the schema: unique names, zip groups of equal
+    length, arguments given once and suites of known tags or models"""
+    names = set()
+    tags = set()
+    for benchmark in specification["benchmarks"]:
+        name = benchmark["model"]["name"]
+        if name in names:
+            raise ValueError("{}: model given twice".format(name))
+        names.add(name)
+        tags.update(benchmark.get("tags", []))
+        tasks = benchmark["tasks"]
+        axes = list(tasks.get("fixed", {})) + list(tasks.get("arguments", {}))
+        for group in tasks.get("zip", []):
+            if len(set(len(values) for values in group.values())) > 1:
+                raise ValueError("{}: zipped arguments {} differ in "
+                                 "length".format(name, ", ".join(group)))
+            axes += list(group)
+        duplicates = set(axis for axis in axes if axes.count(axis) > 1)
+        if duplicates:
+            raise ValueError("{}: {} given more than once".format(
+                name, ", ".join(sorted(duplicates))))
+        for exclusion in tasks.get("exclude", []):
+            if not exclusion:
+                raise ValueError("{}: empty exclusion".format(name))
+            unknown = set(exclusion) - set(axes)
+            if unknown:
+                raise ValueError("{}: exclusion of unknown argument {}".format(
+                    name, ", ".join(sorted(unknown))))
+    for suite, members in specification.get("suites", {}).items():
+        unknown = set(members) - names - tags
+        if unknown:
+            raise ValueError("suite {}: unknown tag or model {}".format(
+                suite, ", ".join(sorted(unknown))))
+
+
+def load(filename="benchmarks.json"):
+    """Returns the validated specification, see the module documentation"""
+    with open(filename) as infile:
+        specification = json.load(infile)
+    if isinstance(specification, list):
+        specification = {"benchmarks": specification}
+    validate(specification, path=filename)
+    check(specification)
+    return specification
+
+
+def select(specification, suite=None, tags=None, models=None):
+    """the benchmarks of the suite, all benchmarks if it is None except
+    those with a tag of OPT_IN, unless it is among the tags or the model is
+    named in models"""
+    if suite is None:
+        return [benchmark for benchmark in specification["benchmarks"]
+                if not set(OPT_IN).intersection(benchmark.get("tags", [])) or
+                set(tags or []).intersection(benchmark.get("tags", [])) or
+                benchmark["model"]["name"] in (models or [])]
+    if suite not in specification.get("suites", {}):
+        raise ValueError("unknown suite {}, known are {}".format(
+            suite, ", ".join(sorted(specification.get("suites", {})))))
+    members = set(specification["suites"][suite])
+    return [benchmark for benchmark in specification["benchmarks"]
+            if benchmark["model"]["name"] in members or
+            members.intersection(benchmark.get("tags", []))]
+
+
+def matches(condition, value):
+    """whether an argument value matches an exclusion, see the module
+    documentation"""
+    if isinstance(condition, list):
+        return value in condition
+    if isinstance(condition, dict):
+        return condition.get("min", value) <= value <= \
+            condition.get("max", value)
+    return value == condition
+
+
+def expand(benchmarks, overrides=None):
+    """
+        Yields the jobs of the benchmarks as dicts of the model name, the
+        command, the arguments in order, the tags, the resources and the
+        repetitions.
+
+        overrides maps arguments to lists of values which replace the values
+        of the benchmarks, arguments a benchmark does not sweep are added as
+        another axis of its product.
+    """
+    overrides = overrides or {}
+    for benchmark in benchmarks:
+        tasks = benchmark["tasks"]
+        # each axis is a tuple of arguments with a list of value tuples
+        axes = [((name,), [(value,)])
+                for name, value in tasks.get("fixed", {}).items()
+                if name not in overrides]
+        axes += [((name,), [(value,) for value in values])
+                 for name, values in tasks.get("arguments", {}).items()
+                 if name not in overrides]
+        for group in tasks.get("zip", []):
+            names = tuple(name for name in group if name not in overrides)
+            if names:
+                axes.append((names, list(zip(*[group[name]
+                                               for name in names]))))
+        axes += [((name,), [(value,) for value in values])
+                 for name, values in overrides.items()]
+        names = [name for axis, _ in axes for name in axis]
+        for combination in it.product(*[values for _, values in axes]):
+            values = [value for position in combination
+                      for value in position]
+            arguments = list(zip(names, values))
+            current = dict(arguments)
+            if any(all(matches(condition, current[name])
+                       for name, condition in exclusion.items()
+                       if name in current)
+                   for exclusion in tasks.get("exclude", [])):
+                continue
+            yield {"name": benchmark["model"]["name"],
+                   "command": tasks["command"],
+                   "arguments": arguments,
+                   "tags": benchmark.get("tags", []),
+                   "resources": benchmark.get("resources", {}),
+                   "repetitions": benchmark.get("repetitions", 1)}
+
+
+def command(job):
+    """the command line of the job, relative to the benchmark directory"""
+    return " ".join([job["command"]] + [
+        "{} {}".format(name, value) for name, value in job["arguments"]] +
+        ["--name", job["name"]])
+
+
+def value(text):
+    """argument value given on the command line, numbers are compared as
+    numbers"""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def string(text):
+    """argument value given on the command line compared to a string value
+    of the specification, quotes are optional"""
+    parsed = value(text)
+    return parsed if isinstance(parsed, str) else text
+
+
+def condition(text):
+    """
+        Parses a condition on an argument like "N<=800", "--placer=byNeuron"
+        or "n_size=4,8" into the argument name and a test of its value. "="
+        accepts a comma separated list of values.
+    """
+    match = re.match(r"^-*([\w.-]+?)\s*(<=|>=|!=|<|>|=)\s*(.+)$", text)
+    if match is None:
+        raise ValueError("invalid condition {}, expected an argument, one "
+                         "of {} and a value".format(
+                             text, " ".join(op for op, _ in OPERATORS)))
+    name, symbol, threshold = match.groups()
+    compare = dict(OPERATORS)[symbol]
+    if compare is None:
+        items = threshold.split(",")
+        values = [value(item) for item in items]
+        # string values of the specification like "true" are not parsed
+        texts = [string(item) for item in items]
+        return "--" + name, lambda current: current in (
+            texts if isinstance(current, str) else values)
+    text = string(threshold)
+    threshold = value(threshold)
+
+    def test(current):
+        if isinstance(current, str):
+            return compare(current, text)
+        try:
+            return compare(current, threshold)
+        except TypeError:
+            # e.g. a boolean compared to a string
+            return False
+    return "--" + name, test
+
+
+def select_jobs(jobs, models=None, tags=None, conditions=None):
+    """
+        Yields the jobs of models matching one of the shell patterns, with
+        one of the tags and whose arguments meet all conditions, see
+        condition. Jobs without an argument of a condition are dropped.
+    """
+    for job in jobs:
+        if models and not any(fnmatch.fnmatchcase(job["name"], pattern)
+                              for pattern in models):
+            continue
+        if tags and not set(tags).intersection(job["tags"]):
+            continue
+        arguments = dict(job["arguments"])
+        if conditions and not all(
+                name in arguments and test(arguments[name])
+                for name, test in conditions):
+            continue
+        yield job
+
+
+def identifier(job):
+    """name of the job from its model and argument values, used for the
+    files parse.py writes per job"""
+    return "_".join([job["name"]] + [re.sub(r"[^\w.-]", "", str(value))
+                                     for _, value in job["arguments"]])
+
+
+def recorded(job, record):
+    """whether the result record was written by the job, records store the
+    command line of the benchmark script"""
+    if record.get("model") != job["name"] or "arguments" not in record:
+        return False
+    given = record["arguments"]
+    arguments = dict(zip(given, given[1:]))
+    return all(arguments.get(name) == str(value)
+               for name, value in job["arguments"])
@@ -0,0 +1,58 @@
+import gzip
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, "mapping", "networks"))
+import persisted
+import results
+
+PLACEMENT = """<?xml version="1.0"?>
+<boost_serialization><marocco><placement>
+<count>3</count><item_version>0</item_version>
+<item><bio_neuron>1</bio_neuron><address><dnc_merger>2</dnc_merger></address></item>
+<item><bio_neuron>2</bio_neuron><address><dnc_merger>2</dnc_merger></address></item>
+<item><bio_neuron>3</bio_neuron><address><dnc_merger>3</dnc_merger></address></item>
+</placement></marocco></boost_serialization>
+"""
+
+# placement of a marocco version serializing the merger under another tag
+RENAMED = PLACEMENT.replace("dnc_merger", "merger")
+
+EMPTY = """<?xml version="1.0"?>
+<boost_serialization><marocco><placement>
+<count>0</count><item_version>0</item_version>
+</placement></marocco></boost_serialization>
+"""
+
+NO_PLACEMENT = """<?xml version="1.0"?>
+<boost_serialization><marocco><l1_routing/></marocco></boost_serialization>
+"""
+
+
+def archive(directory, content):
+    filename = str(directory.join("results_model_task.xml.gz"))
+    with gzip.open(filename, 'wt') as outfile:
+        outfile.write(content)
+    return filename
+
+
+def test_mergers(tmpdir):
+    assert persisted.mergers(archive(tmpdir, PLACEMENT)) == 2
+
+
+@pytest.mark.parametrize("content", [RENAMED, EMPTY, NO_PLACEMENT])
+def test_mergers_without_tags(tmpdir, content):
+    with pytest.raises(ValueError):
+        persisted.mergers(archive(tmpdir, content))
+
+
+@pytest.mark.parametrize("content, expected",
+                         [(PLACEMENT, 2), (RENAMED, None)])
+def test_record_mergers(tmpdir, content, expected):
+    result = results.Result("model", "task")
+    result.persist = archive(tmpdir, content)
+    result.finish()
+    assert results.metrics(result.to_dict()).get("mergers") == expected
@@ -0,0 +1,57 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+import spec
+
+BENCHMARKS = [{
+    "model": {"name": "model"},
+    "tasks": {
+        "command": "run.py",
+        "arguments": {"--placer": ["byNeuron", "byEnum"],
+                      "--ignore_blacklisting": ["true", "false"],
+                      "--periodic": [True, False],
+                      "--N": [100, 200]}}}]
+
+
+def selected(*conditions):
+    return list(spec.select_jobs(
+        spec.expand(BENCHMARKS),
+        conditions=[spec.condition(text) for text in conditions]))
+
+
+@pytest.mark.parametrize("text", ["placer=byEnum", 'placer="byEnum"',
+                                  "--placer=byEnum,other"])
+def test_string_argument(text):
+    jobs = selected(text)
+    assert len(jobs) == 8
+    assert all(dict(job["arguments"])["--placer"] == "byEnum"
+               for job in jobs)
+
+
+@pytest.mark.parametrize("text", ["ignore_blacklisting=true",
+                                  'ignore_blacklisting="true"',
+                                  "ignore_blacklisting=true,maybe"])
+def test_bool_like_string_argument(text):
+    jobs = selected(text)
+    assert len(jobs) == 8
+    assert all(dict(job["arguments"])["--ignore_blacklisting"] == "true"
+               for job in jobs)
+
+
+def test_bool_like_string_argument_negated():
+    assert len(selected("ignore_blacklisting!=true")) == 8
+
+
+def test_bool_argument():
+    jobs = selected("periodic=true")
+    assert len(jobs) == 8
+    assert all(dict(job["arguments"])["--periodic"] is True for job in jobs)
+
+
+def test_number_argument():
+    assert len(selected("N<=100")) == 8
+    assert len(selected("N=100,200", "placer=byNeuron")) == 8